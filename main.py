@@ -1,7 +1,6 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from utils.data_loader import load_data, preprocess_artists
+from utils.registry import get_dataset, get_aggregates, get_figure, get_track_sources
 from utils.ui import inject_global_css, render_page_header, card, footer
 
 st.set_page_config(page_title="Music Recommender", layout="wide")
@@ -24,47 +23,35 @@ with card():
     - Interactive Dashboard: top artists/albums by popularity and feature distributions  
     """)
 
-import os
-from utils.data_loader import load_data
-
-DATA_PATH = os.path.join(os.path.dirname(__file__), "dataset.csv")
-df = load_data(DATA_PATH)
-df = preprocess_artists(df)
+df = get_dataset()
+aggregates = get_aggregates(df)
 
 st.markdown("## 🎧 Dataset Insights — Top 10 Only")
+sources = get_track_sources()
+st.caption(f"{len(df):,} distinct tracks, merged from {len(sources.canonical_of):,} CSV rows "
+           f"(a track listed under several genres is one track here).")
 
 tabs = st.tabs(["Artists", "Songs", "Albums"])
 
 with tabs[0]:
     with card("Top 10 Artists"):
-        if 'popularity' in df.columns:
-            exploded = df[['artists_split','popularity']].explode('artists_split')
-            by_artist = exploded.groupby('artists_split', as_index=False)['popularity'].mean().sort_values('popularity', ascending=False)
-            top_artists = by_artist.head(10)
-            fig2 = px.bar(top_artists, x='artists_split', y='popularity', title="Top 10 Artists (mean popularity)")
-        else:
-            all_artists = [a.strip() for sublist in df['artists_split'] for a in sublist]
-            counts = pd.Series(all_artists).value_counts().head(10)
-            fig2 = px.bar(counts, x=counts.index, y=counts.values, title="Top 10 Artists (count)")
-        fig2.update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0))
+        fig2 = get_figure(df, "top_artists", {"n": 10}, lambda: px.bar(
+            aggregates.top("artist", 10), x='artist', y='popularity', title="Top 10 Artists (mean popularity)"
+        ).update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0)))
         st.plotly_chart(fig2, use_container_width=True)
 
 with tabs[1]:
     with card("Top 10 Songs"):
-        top_songs = df.sort_values('popularity', ascending=False).head(10) if 'popularity' in df.columns else df.head(10)
-        fig3 = px.bar(top_songs, x='track_name', y='popularity', title="Top 10 Songs by Popularity")
-        fig3.update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0), xaxis_tickangle=-30)
+        fig3 = get_figure(df, "top_songs", {"n": 10}, lambda: px.bar(
+            aggregates.top_songs(10), x='track_name', y='popularity', title="Top 10 Songs by Popularity"
+        ).update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0), xaxis_tickangle=-30))
         st.plotly_chart(fig3, use_container_width=True)
 
 with tabs[2]:
     with card("Top 10 Albums"):
-        if 'popularity' in df.columns:
-            top_albums = df.groupby('album_name', as_index=False)['popularity'].mean().sort_values('popularity', ascending=False).head(10)
-            fig4 = px.bar(top_albums, x='album_name', y='popularity', title="Top 10 Albums (mean popularity)")
-        else:
-            counts = df['album_name'].value_counts().head(10)
-            fig4 = px.bar(counts, x=counts.index, y=counts.values, title="Top 10 Albums (count)")
-        fig4.update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0), xaxis_tickangle=-25)
+        fig4 = get_figure(df, "top_albums", {"n": 10}, lambda: px.bar(
+            aggregates.top("album", 10), x='album', y='popularity', title="Top 10 Albums (mean popularity)"
+        ).update_layout(hovermode="x unified", height=480, margin=dict(l=10, r=10, t=50, b=0), xaxis_tickangle=-25))
         st.plotly_chart(fig4, use_container_width=True)
 
 st.markdown("---")
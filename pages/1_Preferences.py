@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-from utils.data_loader import load_data, preprocess_artists
+import numpy as np
+from utils.registry import get_dataset, get_facets, get_typeahead
 from pathlib import Path
 from utils.ui import inject_global_css, render_page_header, card, footer
 
@@ -12,19 +13,7 @@ render_page_header(
     emoji="🛠️",
 )
 
-import os
-from utils.data_loader import load_data
-
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset.csv")
-
-
-@st.cache_data(show_spinner=False)
-def load_and_prep(path):
-    df = load_data(path)
-    df = preprocess_artists(df)
-    return df
-
-df = load_and_prep(DATA_PATH)
+df = get_dataset()
 
 if "curated_list" not in st.session_state:
     st.session_state.curated_list = []  
@@ -55,32 +44,19 @@ with left_col:
     with card("Create your curated list"):
         st.markdown("Use filters to narrow songs and add the ones you like to your curated list (used later by recommendation / playlist pages).")
 
-    filter_type = st.selectbox("Choose filter type", ["Artist", "Album", "Genre"]) 
-    if filter_type == "Artist":
-        all_artists = [a for sub in df["artists_split"] for a in sub]
-        options = sorted(set(all_artists))
-    elif filter_type == "Album":
-        options = sorted(df["album_name"].dropna().unique().tolist())
-    else:
-        options = sorted(df["track_genre"].dropna().unique().tolist())
-
-    selected_filter_values = st.multiselect(f"Select {filter_type}(s)", options, default=None)
+    facets = get_facets(df)
+    filter_type = st.selectbox("Choose filter type", list(facets))
+    facet = facets[filter_type]
 
+    selected_filter_values = st.multiselect(f"Select {filter_type}(s)", facet.options, default=None)
 
     if selected_filter_values:
-        if filter_type == "Artist":
-           
-            mask = df["artists_split"].apply(lambda lst: any(a in selected_filter_values for a in lst))
-            filtered = df[mask].reset_index(drop=True)
-        elif filter_type == "Album":
-            filtered = df[df["album_name"].isin(selected_filter_values)].reset_index(drop=True)
-        else:
-            filtered = df[df["track_genre"].isin(selected_filter_values)].reset_index(drop=True)
+        matching_rows = facet.rows(selected_filter_values)
     else:
-        filtered = df.copy().reset_index(drop=True)
+        matching_rows = np.arange(len(df))
 
-    st.markdown(f"**Matching songs: {len(filtered):,}** (showing top 200 rows)")
-    display_df = filtered[["track_name", "artists", "album_name", "track_genre", "popularity"]].head(200).copy()
+    st.markdown(f"**Matching songs: {len(matching_rows):,}** (showing top 200 rows)")
+    display_df = df.iloc[matching_rows[:200]][["track_name", "artists", "album_name", "track_genre", "popularity"]]
     display_df = display_df.reset_index() 
     display_df.rename(columns={"index": "df_index"}, inplace=True)
 
@@ -93,17 +69,7 @@ with left_col:
     )
 
     if st.button("Add selected songs to curated list"):
-        idxs = []
-        for sel in selected_rows:
-            filtered_row = display_df.loc[sel]
-            cond = (
-                (df["track_name"] == filtered_row["track_name"]) &
-                (df["artists"] == filtered_row["artists"]) &
-                (df["album_name"] == filtered_row["album_name"])
-            )
-            original_indices = df[cond].index.tolist()
-            if original_indices:
-                idxs.append(original_indices[0])
+        idxs = [int(display_df.loc[sel, "df_index"]) for sel in selected_rows]
         added = add_to_curated(idxs)
         st.success(f"Added {added} song(s) to your curated list.")
 
@@ -139,8 +105,8 @@ with right_col:
     st.markdown(" ### Find songs by typing")
     q = st.text_input("Quick search (type song title or artist fragment):", "")
     if q:
-        qmask = df["track_name"].str.contains(q, case=False, na=False) | df["artists"].str.contains(q, case=False, na=False)
-        quick = df[qmask][["track_name", "artists", "album_name", "track_genre", "popularity"]].head(50)
+        quick_rows = get_typeahead(df).search(q, limit=50)
+        quick = df.iloc[quick_rows][["track_name", "artists", "album_name", "track_genre", "popularity"]]
         st.table(quick)
 
 
@@ -1,28 +1,15 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-from utils.data_loader import load_data, preprocess_artists
+from utils.registry import get_dataset, numeric_columns, get_scaled_features, get_knn_index, get_name_index, get_neighbor_table, get_hybrid_ranker, BRUTE_MAX_ROWS
+from utils.ann import IVFIndex, recall_at_k, kneighbors_excluding
+from utils.vector_store import accuracy_report, STORE_MODES
 from utils.ui import inject_global_css, render_page_header, card, footer
 
 st.set_page_config(page_title="Song Recommendations", layout="wide")
 inject_global_css()
 render_page_header("Personalized Song Recommendations (kNN)", "Find tracks similar to your curated choices.", "🎧")
 
-import os
-from utils.data_loader import load_data
-
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset.csv")
-
-
-@st.cache_data(show_spinner=False)
-def load_prepared_data(path):
-    df = load_data(path)
-    df = preprocess_artists(df)
-    return df
-
-df = load_prepared_data(DATA_PATH)
+df = get_dataset()
 
 if "curated_list" not in st.session_state or not st.session_state.curated_list:
     st.warning("⚠️ You don't have any songs in your curated list yet. Go to the 'Preferences' page first.")
@@ -32,25 +19,54 @@ curated_df = pd.DataFrame(st.session_state.curated_list)
 with card("Your current curated songs"):
     st.table(curated_df[["track_name", "artists", "album_name", "track_genre"]])
 
-numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+numeric_cols = numeric_columns(df)
 if not numeric_cols:
     st.error("No numeric features found in dataset for similarity computation.")
     st.stop()
 
-@st.cache_resource(show_spinner=False)
-def get_knn_artifacts(df_sig_cols, df_vals):
-    scaler_local = StandardScaler()
-    features32 = df_vals.astype("float32", copy=False)
-    scaled_local = scaler_local.fit_transform(features32)
-    model_local = NearestNeighbors(metric="cosine", algorithm="brute")
-    model_local.fit(scaled_local)
-    return scaler_local, scaled_local, model_local
-
-df_signature = (tuple(numeric_cols), float(df[numeric_cols].sum(numeric_only=True).sum()))
-scaler, scaled_features, model = get_knn_artifacts(df_signature, df[numeric_cols].values)
-
 st.markdown("### Configure Recommendation Settings")
 
+with st.expander("Search engine"):
+    backend_label = st.radio(
+        "Neighbour search",
+        ["Auto", "Exact (brute force)", "Approximate (IVF)", "Compressed (float16)", "Compressed (PQ)"],
+        horizontal=True,
+        help=f"Auto switches to the approximate index above {BRUTE_MAX_ROWS:,} songs.",
+    )
+    backend = {"Auto": "auto", "Exact (brute force)": "brute", "Approximate (IVF)": "ivf",
+               "Compressed (float16)": "float16", "Compressed (PQ)": "pq"}[backend_label]
+    index = get_knn_index(df, numeric_cols, backend)
+    # Compressed stores carry their re-rank source, the mapped scaled-features artifact, so
+    # only the other backends need the scaled matrix itself.
+    scaled_features = index.exact if backend in STORE_MODES else get_scaled_features(df, numeric_cols)[1]
+    query_kwargs = {}
+    if isinstance(index, IVFIndex):
+        query_kwargs["n_probe"] = st.slider("Cells scanned per query (higher = better recall, slower)",
+                                            min_value=1, max_value=min(64, index.n_lists), value=min(8, index.n_lists))
+        if st.button("Measure recall@10 against exact search"):
+            report = recall_at_k(index, scaled_features, k=10, n_queries=200, n_probe=query_kwargs["n_probe"])
+            st.write(f"Recall@10: **{report['recall']:.3f}** — {report['ann_ms_per_query']:.2f} ms/query "
+                     f"vs {report['exact_ms_per_query']:.2f} ms exact")
+    elif backend in STORE_MODES:
+        st.caption(f"{len(index):,} songs in {index.nbytes / 2**20:.1f} MiB; candidates re-ranked on the exact vectors.")
+        if st.button("Measure accuracy against exact search"):
+            report = accuracy_report(index, scaled_features, k=10, n_queries=200)
+            st.write(f"Recall@10: **{report['recall_reranked']:.3f}** re-ranked, {report['recall']:.3f} raw — "
+                     f"mean score error {report['mean_abs_score_error']:.4f}, {report['compression']:.1f}x smaller")
+    else:
+        st.caption(f"Exact search over {len(index):,} songs.")
+
+with st.expander("Ranking"):
+    ranking = st.radio("Rank recommendations by", ["Audio similarity", "Hybrid"], horizontal=True,
+                       help="Hybrid adds artist association-rule lift and a popularity prior to the similarity score.")
+    hybrid_weights = None
+    if ranking == "Hybrid":
+        hybrid_weights = {
+            "similarity": 1.0,
+            "rules": st.slider("Artist rules weight", min_value=0.0, max_value=1.0, value=0.3, step=0.05),
+            "popularity": st.slider("Popularity weight", min_value=0.0, max_value=1.0, value=0.1, step=0.05),
+        }
+
 num_centroids = st.slider("How many curated songs you want", min_value=1, max_value=min(10, len(curated_df)), value=min(3, len(curated_df)), step=1)
 num_neighbors = st.slider("Number of recommendations per song", min_value=5, max_value=20, value=10, step=1)
 
@@ -65,19 +81,29 @@ if len(centroid_choices) > num_centroids:
     centroid_choices = centroid_choices[:num_centroids]
 
 
-recommendations = []
+name_index = get_name_index(df)
+seeds = [(name, name_index.first_row(name)) for name in centroid_choices]
+seeds = [(name, row) for name, row in seeds if row is not None]
+curated_rows = name_index.rows_many(curated_df["track_name"])
+seed_rows = [row for _, row in seeds]
+if not seed_rows:
+    st.warning("Choose at least one of your curated songs to find similar tracks.")
+    st.stop()
+neighbor_table = get_neighbor_table(df, numeric_cols)
+neighbor_rows = None
+if hybrid_weights is not None:
+    ranker = get_hybrid_ranker(df, numeric_cols)
+    neighbor_rows = ranker.recommend([[row] for row in seed_rows], num_neighbors,
+                                     exclude_rows=curated_rows, weights=hybrid_weights)
+elif neighbor_table is not None and backend in ("auto", "brute"):
+    neighbor_rows = neighbor_table.neighbors_excluding(seed_rows, num_neighbors, exclude_rows=curated_rows)
+if neighbor_rows is None:
+    neighbor_rows = kneighbors_excluding(index, scaled_features, seed_rows, num_neighbors,
+                                         exclude_rows=curated_rows, **query_kwargs)
 
-for source_name in centroid_choices:
-    matches = df[df["track_name"].str.lower() == source_name.lower()]
-    if matches.empty:
-        continue
-    idx = matches.index[0]
-    distances, indices = model.kneighbors([scaled_features[idx]], n_neighbors=num_neighbors + 1)
-    rec_indices = indices.flatten()[1:]
-    rec_songs = df.iloc[rec_indices]
-    rec_songs = rec_songs[~rec_songs["track_name"].isin(curated_df["track_name"])]
-    rec_songs["source_song"] = source_name
-    recommendations.append(rec_songs.head(num_neighbors))
+recommendations = []
+for (source_name, _), rec_indices in zip(seeds, neighbor_rows):
+    recommendations.append(df.iloc[rec_indices].assign(source_song=source_name))
 
 if recommendations:
     rec_df = pd.concat(recommendations).reset_index(drop=True)
@@ -103,7 +129,7 @@ for source_name in centroid_choices:
     subset = rec_df[rec_df["source_song"] == source_name].head(num_neighbors)
     if subset.empty:
         continue
-    source_pop = df.loc[df["track_name"].str.lower() == source_name.lower(), "popularity"].mean()
+    source_pop = df["popularity"].to_numpy()[name_index.rows(source_name)].mean()
     bar_df = subset.copy().assign(kind="Recommendation")
     source_row = {"track_name": source_name, "popularity": source_pop, "kind": "Source"}
     bar_df = pd.concat([pd.DataFrame([source_row]), bar_df[["track_name", "popularity", "kind"]]])
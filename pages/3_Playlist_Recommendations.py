@@ -1,28 +1,16 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 import plotly.express as px
-from utils.data_loader import load_data, preprocess_artists
+from utils.registry import get_dataset, numeric_columns, get_scaled_features, get_cluster_index, get_name_index, sweep_kmeans, get_figure
+from utils.playlist_cluster import suggest_k
+from utils.plot_data import stratified_rows, binned_density
 from utils.ui import inject_global_css, render_page_header, card, footer
 
 st.set_page_config(page_title="Playlist Recommendation", layout="wide")
 inject_global_css()
 render_page_header("Playlist Recommendation using K-Means Clustering", "Group songs with similar audio profiles into playlists.", "🎶")
 
-import os
-from utils.data_loader import load_data
-
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset.csv")
-
-@st.cache_data(show_spinner=False)
-def load_prepared_data(path):
-    df = load_data(path)
-    df = preprocess_artists(df)
-    return df
-
-df = load_prepared_data(DATA_PATH)
+df = get_dataset()
 
 if "curated_list" not in st.session_state or not st.session_state.curated_list:
     st.warning("⚠️ You don't have any songs in your curated list yet. Please go to the 'Preferences' page first.")
@@ -32,52 +20,56 @@ curated_df = pd.DataFrame(st.session_state.curated_list)
 with card("Your current curated songs"):
     st.table(curated_df[["track_name", "artists", "album_name", "track_genre"]])
 
-numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+numeric_cols = numeric_columns(df)
 if not numeric_cols:
     st.error("No numeric features found for clustering.")
     st.stop()
 
-@st.cache_resource(show_spinner=False)
-def get_scaled_features(df_sig_cols, df_vals):
-    scaler_local = StandardScaler()
-    features32 = df_vals.astype("float32", copy=False)
-    scaled_local = scaler_local.fit_transform(features32)
-    return scaler_local, scaled_local
-
-df_signature = (tuple(numeric_cols), float(df[numeric_cols].sum(numeric_only=True).sum()))
-scaler, scaled_features = get_scaled_features(df_signature, df[numeric_cols].values)
+scaler, scaled_features = get_scaled_features(df, numeric_cols)
 
 st.markdown("### Configure Playlist Creation Settings")
 max_clusters = max(1, min(50, max(1, len(curated_df) - 1)))
-num_clusters = st.slider("Number of playlists (clusters)", min_value=1, max_value=max_clusters, value=min(3, max_clusters), step=1)
+sweep_ks = tuple(range(2, max_clusters + 1))
+if st.session_state.get("num_clusters", 1) > max_clusters:
+    st.session_state.num_clusters = max_clusters
+st.session_state.setdefault("num_clusters", min(3, max_clusters))
+
+with st.expander("📈 Cluster quality"):
+    st.caption("Fits every cluster count in parallel and scores it; the best silhouette becomes the slider value.")
+    if sweep_ks and st.button("Evaluate cluster counts"):
+        with st.spinner(f"Fitting k = 2..{max_clusters}..."):
+            st.session_state.k_sweep = (sweep_ks, sweep_kmeans(df, numeric_cols, sweep_ks))
+        best_k = suggest_k(st.session_state.k_sweep[1])
+        if best_k is not None:
+            st.session_state.num_clusters = best_k
+    swept = st.session_state.get("k_sweep")
+    if swept is not None and swept[0] == sweep_ks:
+        metrics = swept[1]
+        st.line_chart(metrics[["silhouette", "davies_bouldin"]])
+        st.dataframe(metrics.style.format("{:.3f}"), use_container_width=True)
+        best_k = suggest_k(metrics)
+        if best_k is not None:
+            st.caption(f"Suggested number of playlists: **{best_k}** (highest silhouette; lower Davies-Bouldin is better).")
+
+num_clusters = st.slider("Number of playlists (clusters)", min_value=1, max_value=max_clusters, step=1, key="num_clusters")
 playlist_size = st.slider("Playlist size per cluster", min_value=10, max_value=50, value=10, step=1)
+playlist_order = st.radio("Playlist order", ["Closest to the cluster centre", "Random sample"], horizontal=True)
 
-@st.cache_resource(show_spinner=False)
-def fit_kmeans(sig, n_clusters):
-    km = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    labels = km.fit_predict(sig)
-    return km, labels
-
-_, labels = fit_kmeans(scaled_features, num_clusters)
-df["cluster"] = labels
+cluster_index = get_cluster_index(df, numeric_cols, num_clusters)
+labels = cluster_index.labels
 
-cluster_assignments = []
-for _, row in curated_df.iterrows():
-    match = df[df["track_name"].str.lower() == row["track_name"].lower()]
-    if not match.empty:
-        cluster_assignments.append(int(match["cluster"].iloc[0]))
-curated_df["cluster"] = cluster_assignments if cluster_assignments else [None] * len(curated_df)
+name_index = get_name_index(df)
+curated_first_rows = [name_index.first_row(name) for name in curated_df["track_name"]]
+curated_df["cluster"] = [int(labels[r]) if r is not None else None for r in curated_first_rows]
+curated_rows = name_index.rows_many(curated_df["track_name"])
 
 playlist_recs = []
 for c in curated_df["cluster"].dropna().unique():
-    cluster_songs = df[df["cluster"] == c]
-    cluster_songs = cluster_songs[~cluster_songs["track_name"].isin(curated_df["track_name"])]
-    cluster_songs["playlist_cluster"] = c
-    n_pick = min(playlist_size, len(cluster_songs))
-    if n_pick == 0:
+    rows = cluster_index.playlist(int(c), playlist_size, exclude_rows=curated_rows,
+                                  rank="random" if playlist_order == "Random sample" else "centroid")
+    if len(rows) == 0:
         continue
-    sampled = cluster_songs.sample(n=n_pick, random_state=42)
-    playlist_recs.append(sampled)
+    playlist_recs.append(df.iloc[rows].assign(playlist_cluster=c))
 
 if playlist_recs:
     rec_df = pd.concat(playlist_recs).reset_index(drop=True)
@@ -87,16 +79,39 @@ else:
     st.stop()
 
 st.markdown("### Playlist Visualization")
-fig = px.scatter_3d(
-    df.sample(min(len(df), 1000)),
-    x="danceability" if "danceability" in df.columns else numeric_cols[0],
-    y="energy" if "energy" in df.columns else numeric_cols[1],
-    z="valence" if "valence" in df.columns else numeric_cols[2],
-    color="cluster",
-    hover_data=["track_name", "artists", "album_name"],
-    title="K-Means Clusters of Songs (based on audio features)"
-)
-fig.update_layout(height=620, margin=dict(l=10, r=10, t=50, b=0))
+plot_cols = [
+    "danceability" if "danceability" in df.columns else numeric_cols[0],
+    "energy" if "energy" in df.columns else numeric_cols[1],
+    "valence" if "valence" in df.columns else numeric_cols[2],
+]
+plot_view = st.radio("Cluster view", ["Sampled songs", "Density"], horizontal=True,
+                     help="Sampled songs keeps every cluster visible; Density bins the whole catalogue.")
+plot_params = {"features": numeric_cols, "k": num_clusters, "axes": plot_cols, "view": plot_view}
+
+
+def build_sampled_scatter():
+    plot_df = df.iloc[stratified_rows(labels, n_total=1000)][plot_cols + ["track_name", "artists", "album_name"]]
+    return px.scatter_3d(
+        plot_df.assign(cluster=labels[plot_df.index]),
+        x=plot_cols[0], y=plot_cols[1], z=plot_cols[2],
+        color="cluster",
+        hover_data=["track_name", "artists", "album_name"],
+        title="K-Means Clusters of Songs (based on audio features)"
+    ).update_layout(height=620, margin=dict(l=10, r=10, t=50, b=0))
+
+
+def build_density_scatter():
+    cells = binned_density(df[plot_cols].to_numpy(), plot_cols, bins=16, labels=labels)
+    return px.scatter_3d(
+        cells.rename(columns={"label": "cluster"}),
+        x=plot_cols[0], y=plot_cols[1], z=plot_cols[2],
+        color="cluster", size="count",
+        title="K-Means Clusters of Songs (catalogue density, coloured by majority cluster)"
+    ).update_layout(height=620, margin=dict(l=10, r=10, t=50, b=0))
+
+
+fig = get_figure(df, "cluster_scatter", plot_params,
+                 build_sampled_scatter if plot_view == "Sampled songs" else build_density_scatter)
 st.plotly_chart(fig, use_container_width=True)
 
 st.markdown("### Playlist Details")
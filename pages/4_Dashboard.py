@@ -1,31 +1,14 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.data_loader import load_data, preprocess_artists
+from utils.registry import get_dataset, get_aggregates, get_artist_graph, get_memory_report, COMPACT
 from utils.ui import inject_global_css, render_page_header, card, footer
 
 st.set_page_config(page_title="User Dashboard", layout="wide")
 inject_global_css()
 render_page_header("Music Listening Dashboard", "Insights from your curated selection.", "📊")
 
-import os
-from utils.data_loader import load_data
-
-DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset.csv")
-
-@st.cache_data(show_spinner=False)
-def load_prepared_data(path):
-    df = load_data(path)
-    df = preprocess_artists(df)
-    return df
-
-df = load_prepared_data(DATA_PATH)
-if "popularity" not in df.columns:
-    feature_cols = [c for c in ["danceability", "energy", "valence", "tempo"] if c in df.columns]
-    if feature_cols:
-        df["popularity"] = df[feature_cols].mean(axis=1)
-    else:
-        df["popularity"] = np.random.uniform(40, 80, len(df))  
+df = get_dataset()
 
 if "curated_list" not in st.session_state or not st.session_state.curated_list:
     st.warning("⚠️ No user preferences found. Please create your curated list on the Preferences page first.")
@@ -33,12 +16,10 @@ if "curated_list" not in st.session_state or not st.session_state.curated_list:
 
 curated_df = pd.DataFrame(st.session_state.curated_list)
 if 'popularity' not in curated_df.columns or curated_df['popularity'].isna().all():
-    pop_map = df.groupby(df['track_name'].str.lower())['popularity'].max()
-    curated_df['popularity'] = curated_df['track_name'].str.lower().map(pop_map)
+    aggregates = get_aggregates(df)
+    curated_df['popularity'] = aggregates.popularity_of(curated_df['track_name'])
     if curated_df['popularity'].isna().any():
-        if {'danceability','energy','valence','tempo'}.issubset(set(df.columns)):
-            feat_map = df.set_index(df['track_name'].str.lower())[['danceability','energy','valence','tempo']].mean(axis=1)
-            curated_df['popularity'] = curated_df['popularity'].fillna(curated_df['track_name'].str.lower().map(feat_map))
+        curated_df['popularity'] = curated_df['popularity'].fillna(pd.Series(aggregates.feature_mean_of(curated_df['track_name']), index=curated_df.index))
         curated_df['popularity'] = curated_df['popularity'].fillna(curated_df['popularity'].median())
 st.markdown("### 🎧 Your Selected (Curated) Songs")
 display_cols = ["track_name", "artists", "album_name", "track_genre"]
@@ -68,7 +49,17 @@ fig_artists.update_layout(hovermode="x unified", height=480, margin=dict(l=10, r
 with card("Top Artists You Prefer"):
     st.plotly_chart(fig_artists, use_container_width=True)
 
-top_genres = curated_df["track_genre"].value_counts().head(5)
+if not top_artists.empty:
+    favourite = top_artists.index[0]
+    related = get_artist_graph(df).related(favourite, 8)
+    with card(f"Artists that go with {favourite}"):
+        if related.empty:
+            st.caption("No artist shares enough tracks with this one yet.")
+        else:
+            st.dataframe(related[["artist", "tracks_together", "confidence", "lift"]], hide_index=True)
+
+genres_exploded = curated_df["track_genre"].astype(str).str.split(";").explode()
+top_genres = genres_exploded.value_counts().head(5)
 fig_genres = px.pie(
     names=top_genres.index,
     values=top_genres.values,
@@ -127,9 +118,18 @@ with col1:
     st.metric(label="Number of Favorite Songs", value=len(curated_df))
     st.metric(label="Unique Artists", value=artists_exploded['artists'].nunique())
 with col2:
-    st.metric(label="Unique Genres", value=curated_df['track_genre'].nunique())
+    st.metric(label="Unique Genres", value=genres_exploded.nunique())
 st.metric(label="Average Popularity", value=round(curated_df["popularity"].mean(), 2))
 
+with st.expander("Catalogue memory: default vs compact layout"):
+    st.caption(f"This server loads the {'compact' if COMPACT else 'default'} layout (MUSIC_RECO_COMPACT=1 selects compact).")
+    if st.button("Measure per-column memory"):
+        report = get_memory_report()
+        total = report.loc["total"]
+        st.write(f"**{total['bytes_before'] / 2**20:.1f} MiB → {total['bytes_after'] / 2**20:.1f} MiB** "
+                 f"({total['saved_pct']:.0f}% saved)")
+        st.dataframe(report)
+
 st.success("✅ Dashboard generated based on your listening preferences!")
 footer("Metrics reflect your currently curated list; adjust it to see changes live.")
 
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from utils.data_loader import ArtistIncidence
+
+# Small summary tables the home page and dashboard read instead of the catalogue.
+# They are built once per dataset fingerprint and stored with the other
+# artifacts; a changed CSV gets a new fingerprint and so a fresh build. Tables
+# keep sums and counts, and means are taken when read. The top-songs table
+# keeps the best TOP_N rows.
+
+TOP_N = 50
+NAME_FEATURES = ["danceability", "energy", "valence", "tempo"]
+
+
+def _group_table(keys, popularity):
+    """key -> count, popularity_sum for one (possibly exploded) key column."""
+    frame = pd.DataFrame({"key": np.asarray(keys, dtype=object), "popularity": np.asarray(popularity, dtype=np.float64)})
+    frame = frame[frame["key"].notna() & (frame["key"] != "")]
+    table = frame.groupby("key", sort=False)["popularity"].agg(["size", "sum"])
+    table.columns = ["count", "popularity_sum"]
+    return table
+
+
+def _split_table(values, popularity):
+    """_group_table over a `;`-separated column, each part credited with the row's popularity."""
+    parts = pd.Series(np.asarray(values, dtype=object)).astype(str).str.split(";").explode().str.strip()
+    return _group_table(parts.to_numpy(), np.asarray(popularity, dtype=np.float64)[parts.index.to_numpy()])
+
+
+class Aggregates:
+    def __init__(self, tables, top_n=TOP_N):
+        self.tables = tables
+        self.top_n = top_n
+
+    @classmethod
+    def from_frame(cls, df, incidence=None, top_n=TOP_N):
+        popularity = df["popularity"].to_numpy(dtype=np.float64)
+        tables = {}
+        if incidence is None:
+            incidence = ArtistIncidence.from_artists(df["artists"])
+        tables["artist"] = pd.DataFrame({"count": incidence.counts(),
+                                         "popularity_sum": incidence.matrix.T @ popularity},
+                                        index=pd.Index(incidence.vocab, name="key"))
+        if "album_name" in df.columns:
+            tables["album"] = _group_table(df["album_name"].to_numpy(dtype=object), popularity)
+        if "track_genre" in df.columns:
+            tables["genre"] = _split_table(df["track_genre"].to_numpy(dtype=object), popularity)
+        top = np.argsort(-popularity, kind="stable")[:top_n]
+        tables["songs"] = pd.DataFrame({"track_name": df["track_name"].to_numpy(dtype=object)[top],
+                                        "artists": df["artists"].to_numpy(dtype=object)[top],
+                                        "popularity": popularity[top]})
+        names = pd.Series(df["track_name"].to_numpy(dtype=object)).astype(str).str.lower()
+        by_name = pd.DataFrame({"key": names, "popularity_max": popularity})
+        feature_cols = [c for c in NAME_FEATURES if c in df.columns]
+        if feature_cols:
+            by_name["feature_sum"] = df[feature_cols].to_numpy(dtype=np.float64).mean(axis=1)
+            by_name["feature_count"] = 1
+        tables["name"] = by_name.groupby("key", sort=False).agg(
+            {"popularity_max": "max", **({"feature_sum": "sum", "feature_count": "sum"} if feature_cols else {})})
+        return cls(tables, top_n)
+
+    def top(self, group, n=10, by="popularity"):
+        """Top n keys of "artist", "album" or "genre" by mean popularity (by="popularity") or by row count."""
+        table = self.tables[group]
+        out = pd.DataFrame({"count": table["count"], "popularity": table["popularity_sum"] / table["count"]})
+        return out.sort_values(by, ascending=False, kind="stable").head(n).rename_axis(group).reset_index()
+
+    def top_songs(self, n=10):
+        return self.tables["songs"].head(n)
+
+    def popularity_of(self, names):
+        """Highest popularity among tracks with each name (case-insensitive); NaN for unknown names."""
+        keys = pd.Series(list(names), dtype=object).astype(str).str.lower()
+        return keys.map(self.tables["name"]["popularity_max"]).to_numpy(dtype=np.float64)
+
+    def feature_mean_of(self, names):
+        """Mean of NAME_FEATURES over tracks with each name; NaN for unknown names or without those columns."""
+        table = self.tables["name"]
+        keys = pd.Series(list(names), dtype=object).astype(str).str.lower()
+        if "feature_sum" not in table.columns:
+            return np.full(len(keys), np.nan)
+        return keys.map(table["feature_sum"] / table["feature_count"]).to_numpy(dtype=np.float64)
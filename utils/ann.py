@@ -0,0 +1,152 @@
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Cosine nearest-neighbour indexes with the NearestNeighbors.kneighbors call shape
+# (distances = 1 - cosine similarity), so the recommendation page can swap them.
+#
+# BruteIndex is exact. IVFIndex partitions the normalized vectors into `n_lists`
+# cells with spherical k-means and only scans the `n_probe` cells closest to the
+# query: raising n_probe trades latency for recall, n_probe == n_lists is exact.
+
+
+def _normalize(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class BruteIndex:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        norms = np.linalg.norm(np.asarray(vectors, dtype=np.float32), axis=1)
+        norms[norms == 0] = 1.0
+        self.inv_norms = (1.0 / norms).astype(np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def kneighbors(self, X, n_neighbors=5):
+        Q = _normalize(X)
+        distances = np.empty((len(Q), n_neighbors), dtype=np.float32)
+        indices = np.empty((len(Q), n_neighbors), dtype=np.int64)
+        sims_all = (Q @ np.asarray(self.vectors, dtype=np.float32).T) * self.inv_norms
+        for i, sims in enumerate(sims_all):
+            top = _top_k(sims, n_neighbors)
+            indices[i] = top
+            distances[i] = 1.0 - sims[top]
+        return distances, indices
+
+
+def _assign(X, centroids, chunk_size=8192):
+    out = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), chunk_size):
+        out[start:start + chunk_size] = np.argmax(X[start:start + chunk_size] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(X, n_clusters, n_iter=15, sample_size=None, seed=42):
+    """Unit-norm centroids for already-normalized rows of X, fitted on a random sample."""
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or min(len(X), max(n_clusters * 64, 10000))
+    sample = X[rng.choice(len(X), size=min(sample_size, len(X)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+        membership = csr_matrix((np.ones(len(sample), dtype=np.float32), (labels, np.arange(len(sample)))),
+                                shape=(n_clusters, len(sample)))
+        sums = np.asarray(membership @ sample)
+        filled = np.asarray(membership.sum(axis=1)).ravel() > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, vectors, n_lists=None, n_probe=8, seed=42):
+        normed = _normalize(vectors)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(normed))))
+        n_lists = min(n_lists, len(normed))
+        self.centroids = spherical_kmeans(normed, n_lists, seed=seed)
+        assignment = _assign(normed, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.ids = order.astype(np.int32)
+        self.vectors = normed[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]).astype(np.int64)
+        self.n_probe = n_probe
+
+    @classmethod
+    def from_arrays(cls, arrays, n_probe=8):
+        index = cls.__new__(cls)
+        index.centroids = arrays["centroids"]
+        index.ids = arrays["ids"]
+        index.vectors = arrays["vectors"]
+        index.offsets = arrays["offsets"]
+        index.n_probe = n_probe
+        return index
+
+    def to_arrays(self):
+        return {"centroids": self.centroids, "ids": self.ids, "vectors": self.vectors, "offsets": self.offsets}
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def kneighbors(self, X, n_neighbors=5, n_probe=None):
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        Q = _normalize(X)
+        distances = np.empty((len(Q), n_neighbors), dtype=np.float32)
+        indices = np.empty((len(Q), n_neighbors), dtype=np.int64)
+        probes = np.argsort(-(Q @ self.centroids.T), axis=1)[:, :n_probe]
+        for i, q in enumerate(Q):
+            spans = [(self.offsets[c], self.offsets[c + 1]) for c in probes[i]]
+            if sum(end - start for start, end in spans) < n_neighbors:
+                # Too few candidates in the probed cells: fall back to the exact scan.
+                spans = [(0, len(self.ids))]
+            positions = np.concatenate([np.arange(start, end) for start, end in spans])
+            sims = self.vectors[positions] @ q
+            top = _top_k(sims, n_neighbors)
+            indices[i] = self.ids[positions[top]]
+            distances[i] = 1.0 - sims[top]
+        return distances, indices
+
+
+def recall_at_k(index, vectors, k=10, n_queries=200, n_probe=None, seed=0):
+    """Recall@k of `index` against the exact scan on random catalogue rows used as queries."""
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)])
+    exact = BruteIndex(vectors)
+    start = time.perf_counter()
+    _, truth = exact.kneighbors(queries, n_neighbors=k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    start = time.perf_counter()
+    if isinstance(index, IVFIndex):
+        _, found = index.kneighbors(queries, n_neighbors=k, n_probe=n_probe)
+    else:
+        _, found = index.kneighbors(queries, n_neighbors=k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    hits = sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found))
+    return {"k": k, "recall": hits / (k * len(queries)), "ann_ms_per_query": ann_ms, "exact_ms_per_query": exact_ms}
+
+
+def kneighbors_excluding(index, vectors, seed_rows, n_neighbors, exclude_rows=(), **query_kwargs):
+    """Neighbours of every seed row in one kneighbors call, skipping `exclude_rows`; one id array per seed."""
+    seed_rows = np.asarray(seed_rows, dtype=np.int64)
+    if len(seed_rows) == 0:
+        return []
+    exclude_rows = np.unique(np.concatenate([np.asarray(exclude_rows, dtype=np.int64), seed_rows]))
+    # Over-fetch by the exclusion count so filtering can never leave a seed short.
+    fetch = min(len(index), n_neighbors + len(exclude_rows))
+    _, indices = index.kneighbors(np.asarray(vectors[seed_rows]), n_neighbors=fetch, **query_kwargs)
+    keep = ~np.isin(indices, exclude_rows)
+    return [row[mask][:n_neighbors] for row, mask in zip(indices, keep)]
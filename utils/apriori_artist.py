@@ -1,15 +1,44 @@
-from mlxtend.frequent_patterns import apriori, association_rules
+from mlxtend.frequent_patterns import apriori, fpgrowth, association_rules
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
+from utils.data_loader import ArtistIncidence
 
-def build_artist_rules(df, min_support=0.005, metric='lift', min_threshold=1.0):
-    artist_lists = df['artists_split']
-    unique_artists = sorted(set(a for sub in artist_lists for a in sub))
-    encoded_df = pd.DataFrame(0, index=range(len(artist_lists)), columns=unique_artists)
-    
-    for i, artists in enumerate(artist_lists):
-        for a in artists:
-            encoded_df.loc[i, a] = 1
-    
-    freq_items = apriori(encoded_df, min_support=min_support, use_colnames=True)
-    rules = association_rules(freq_items, metric=metric, min_threshold=min_threshold)
+MINERS = {"apriori": apriori, "fpgrowth": fpgrowth}
+
+def encode_artists(incidence, min_support=0.0):
+    """Sparse boolean track x artist basket frame taken straight from the incidence matrix.
+
+    Artists below min_support cannot appear in any frequent itemset, so they are
+    dropped before mining; support is still measured against every track.
+    """
+    matrix, vocab = incidence.matrix, incidence.vocab
+    if min_support > 0:
+        support = incidence.counts() / max(matrix.shape[0], 1)
+        keep = np.flatnonzero(support >= min_support)
+        matrix, vocab = matrix[:, keep], vocab[keep]
+    encoded = pd.DataFrame.sparse.from_spmatrix(matrix.astype(np.uint8), columns=vocab)
+    return encoded.astype(pd.SparseDtype(bool, False))
+
+def build_artist_rules(df, min_support=0.005, metric='lift', min_threshold=1.0, engine='apriori', incidence=None):
+    if incidence is None:
+        incidence = ArtistIncidence.from_artists(df['artists'])
+    encoded_df = encode_artists(incidence, min_support=min_support)
+    freq_items = MINERS[engine](encoded_df, min_support=min_support, use_colnames=True)
+    rules = association_rules(freq_items, num_itemsets=len(encoded_df), metric=metric, min_threshold=min_threshold)
     return rules
+
+def rules_to_matrix(rules, vocab, metric='lift'):
+    """Sparse artist x artist matrix over `vocab`: [a, b] is the best `metric` of any rule with a in its antecedents and b in its consequents."""
+    n = len(vocab)
+    pairs = pd.DataFrame({"a": rules["antecedents"].map(list), "c": rules["consequents"].map(list),
+                          "v": rules[metric].astype(np.float32)}).explode("a").explode("c")
+    positions = pd.Index(vocab)
+    pairs["a"] = positions.get_indexer(pairs["a"])
+    pairs["c"] = positions.get_indexer(pairs["c"])
+    best = pairs[(pairs["a"] >= 0) & (pairs["c"] >= 0)].groupby(["a", "c"])["v"].max()
+    if best.empty:
+        return csr_matrix((n, n), dtype=np.float32)
+    rows = best.index.get_level_values(0).to_numpy()
+    cols = best.index.get_level_values(1).to_numpy()
+    return csr_matrix((best.to_numpy(dtype=np.float32), (rows, cols)), shape=(n, n))
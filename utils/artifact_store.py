@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import joblib
+import numpy as np
+import sklearn
+from scipy.sparse import csr_matrix, issparse
+
+# On-disk store for fitted models and their matrices, so a restarted server
+# loads instead of refitting. Entries live in <store_dir>/<name>/<digest>/ where
+# the digest covers the store version, the scikit-learn version (pickles are not
+# portable across releases), the dataset fingerprint and the hyperparameters.
+#
+# Arrays are saved as .npy and sparse matrices as their three CSR buffers, all
+# loaded with mmap_mode="r"; everything else (including object arrays, which
+# cannot be mapped) goes through joblib.
+#
+# Saving an entry removes the other entries of the same name that belong to an
+# older store or scikit-learn version or to a fingerprint no longer in use, the
+# way data_loader drops superseded prepared caches. Callers whose params hold a
+# code version (e.g. a builder digest) pass `replaces`, the params every older
+# revision of the entry shares, so those revisions go too.
+
+STORE_VERSION = 1
+
+
+def artifact_dir(store_dir, name, fingerprint, params):
+    params_repr = json.dumps(params, sort_keys=True, default=str)
+    raw = f"{STORE_VERSION}|{sklearn.__version__}|{fingerprint}|{params_repr}"
+    return os.path.join(store_dir, name, hashlib.sha1(raw.encode()).hexdigest()[:16])
+
+
+def save_artifacts(store_dir, name, fingerprint, params, artifacts, keep_fingerprints=(), replaces=None):
+    """Writes `artifacts` (dict of arrays, CSR matrices or picklable objects) atomically.
+
+    Stale entries of `name` are pruned; entries of `fingerprint` and keep_fingerprints stay
+    unless `replaces` is given and their params include all of its items.
+    """
+    target = artifact_dir(store_dir, name, fingerprint, params)
+    if os.path.isdir(target):
+        return target
+    prune_artifacts(store_dir, name, {fingerprint, *keep_fingerprints}, replaces)
+    # Unique per thread too: Streamlit sessions share one process.
+    tmp = f"{target}.{os.getpid()}-{threading.get_ident()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    kinds = {}
+    try:
+        for key, value in artifacts.items():
+            if isinstance(value, np.ndarray) and value.dtype != object:
+                np.save(os.path.join(tmp, f"{key}.npy"), value)
+                kinds[key] = "array"
+            elif issparse(value):
+                value = csr_matrix(value)
+                for part in ("data", "indices", "indptr"):
+                    np.save(os.path.join(tmp, f"{key}.{part}.npy"), getattr(value, part))
+                kinds[key] = ["csr", list(value.shape)]
+            else:
+                joblib.dump(value, os.path.join(tmp, f"{key}.joblib"))
+                kinds[key] = "joblib"
+        meta = {"version": STORE_VERSION, "sklearn": sklearn.__version__, "fingerprint": fingerprint,
+                "params": params, "kinds": kinds}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another worker published the same entry first; keep theirs.
+            pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def prune_artifacts(store_dir, name, keep_fingerprints, replaces=None):
+    """Removes entries of `name` from other store / scikit-learn versions, outside keep_fingerprints,
+    or (with `replaces`) whose params include every item of replaces.
+
+    Processes that still map a removed entry keep its pages until they let go of it.
+    """
+    folder = os.path.join(store_dir, name)
+    try:
+        entries = os.listdir(folder)
+    except OSError:
+        return 0
+    removed = 0
+    for entry in entries:
+        if entry.endswith(".tmp"):
+            # Another worker's save in progress.
+            continue
+        path = os.path.join(folder, entry)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        params = meta.get("params")
+        superseded = replaces is not None and isinstance(params, dict) and all(
+            params.get(key) == value for key, value in replaces.items())
+        if (meta.get("version") != STORE_VERSION or meta.get("sklearn") != sklearn.__version__
+                or meta.get("fingerprint") not in keep_fingerprints or superseded):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def load_artifacts(store_dir, name, fingerprint, params):
+    """Returns the saved dict for this key, or None if it was never stored or is unreadable."""
+    folder = artifact_dir(store_dir, name, fingerprint, params)
+    try:
+        with open(os.path.join(folder, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != STORE_VERSION:
+        return None
+    loaded = {}
+    try:
+        for key, kind in meta["kinds"].items():
+            if kind == "array":
+                loaded[key] = np.load(os.path.join(folder, f"{key}.npy"), mmap_mode="r")
+            elif kind == "joblib":
+                loaded[key] = joblib.load(os.path.join(folder, f"{key}.joblib"), mmap_mode="r")
+            else:
+                parts = [np.load(os.path.join(folder, f"{key}.{p}.npy"), mmap_mode="r") for p in ("data", "indices", "indptr")]
+                loaded[key] = csr_matrix(tuple(parts), shape=tuple(kind[1]), copy=False)
+    except (OSError, ValueError, EOFError):
+        return None
+    return loaded
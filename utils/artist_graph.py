@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# Artist co-occurrence graph: one sparse A^T A over the track x artist incidence
+# matrix counts, for every pair of artists, the tracks crediting both. Pairwise
+# association metrics then follow in closed form, with no min_support to guess:
+#
+#   support(a, b) = n_ab / n        confidence(a -> b) = n_ab / n_a
+#   lift(a, b)    = n_ab * n / (n_a * n_b)
+#
+# These are exactly the single-antecedent, single-consequent rules apriori would
+# report. Each artist's best top_n neighbours (by lift, among pairs seen at least
+# min_count times) are kept as one CSR-style pair of arrays, so "artists that go
+# with X" is one slice.
+
+
+class ArtistGraph:
+    def __init__(self, vocab, cooccurrence, counts, n_tracks, top_n=20, min_count=2):
+        self.vocab = np.asarray(vocab, dtype=object)
+        self.cooccurrence = csr_matrix(cooccurrence, dtype=np.int32)
+        self.cooccurrence.sort_indices()
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.n_tracks = int(n_tracks)
+        self.top_n = top_n
+        self.min_count = min_count
+        self._positions = pd.Index(self.vocab)
+        self._build_neighbors()
+
+    @classmethod
+    def from_incidence(cls, incidence, top_n=20, min_count=2):
+        matrix = csr_matrix(incidence.matrix, dtype=np.int32)
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        cooccurrence = (matrix.T @ matrix).tocsr()
+        counts = cooccurrence.diagonal()
+        cooccurrence.setdiag(0)
+        cooccurrence.eliminate_zeros()
+        return cls(incidence.vocab, cooccurrence, counts, matrix.shape[0], top_n, min_count)
+
+    def _pair_metrics(self, a, b, n_ab):
+        n_ab = np.asarray(n_ab, dtype=np.float64)
+        n_a, n_b = self.counts[a], self.counts[b]
+        return {
+            "support": n_ab / max(self.n_tracks, 1),
+            "confidence": n_ab / np.maximum(n_a, 1),
+            "lift": n_ab * self.n_tracks / np.maximum(n_a * n_b, 1),
+        }
+
+    def _build_neighbors(self):
+        co = self.cooccurrence
+        rows = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+        keep = co.data >= self.min_count
+        rows, cols, n_ab = rows[keep], co.indices[keep], co.data[keep]
+        lift = self._pair_metrics(rows, cols, n_ab)["lift"]
+        order = np.lexsort((-n_ab, -lift, rows))
+        rows, cols, lift = rows[order], cols[order], lift[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = rank < self.top_n
+        self.neighbors = cols[top].astype(np.int32)
+        self.neighbor_offsets = np.concatenate([[0], np.cumsum(np.bincount(rows[top], minlength=len(self.vocab)))])
+
+    def related(self, artist, n=10):
+        """Best neighbours of `artist` by lift, with their co-occurrence counts and metrics."""
+        pos = self._positions.get_indexer([artist])[0]
+        if pos < 0:
+            return pd.DataFrame(columns=["artist", "tracks_together", "support", "confidence", "lift"])
+        ids = self.neighbors[self.neighbor_offsets[pos]:self.neighbor_offsets[pos + 1]][:n]
+        n_ab = np.asarray(self.cooccurrence[pos, ids].toarray()).ravel() if len(ids) else np.empty(0)
+        return pd.DataFrame({"artist": self.vocab[ids], "tracks_together": n_ab.astype(np.int64),
+                             **self._pair_metrics(np.full(len(ids), pos), ids, n_ab)})
+
+    def rules(self, min_support=0.0, min_confidence=0.0, min_lift=0.0):
+        """All a -> b pair rules passing the thresholds, like association_rules with one artist per side."""
+        co = self.cooccurrence
+        a = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+        b = co.indices
+        metrics = self._pair_metrics(a, b, co.data)
+        keep = (metrics["support"] >= min_support) & (metrics["confidence"] >= min_confidence) & (metrics["lift"] >= min_lift)
+        return pd.DataFrame({"antecedent": self.vocab[a[keep]], "consequent": self.vocab[b[keep]],
+                             **{k: v[keep] for k, v in metrics.items()}})
+
+    def to_rule_matrix(self, metric="lift"):
+        """Artist x artist CSR of `metric` over pairs seen at least min_count times (see apriori_artist.rules_to_matrix)."""
+        co = self.cooccurrence
+        a = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+        keep = co.data >= self.min_count
+        values = self._pair_metrics(a[keep], co.indices[keep], co.data[keep])[metric]
+        return csr_matrix((values.astype(np.float32), (a[keep], co.indices[keep])), shape=co.shape)
+
+    def to_arrays(self):
+        return {"vocab": self.vocab, "cooccurrence": self.cooccurrence, "counts": self.counts,
+                "meta": {"n_tracks": self.n_tracks, "top_n": self.top_n, "min_count": self.min_count}}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        meta = arrays["meta"]
+        return cls(arrays["vocab"], arrays["cooccurrence"], arrays["counts"], meta["n_tracks"], meta["top_n"], meta["min_count"])
@@ -1,11 +1,40 @@
+import hashlib
+import json
+import os
+import threading
+import weakref
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from scipy.sparse import csr_matrix
 
-def load_data(path):
-    df = pd.read_csv(path, low_memory=False)
+# Bump whenever load_data/preprocess_artists/canonicalize_tracks change what they produce, so old caches are ignored.
+CACHE_VERSION = 4
+
+TEXT_COLS = ["track_id", "track_name", "artists", "album_name", "track_genre"]
+FEATURE_COLS = ["danceability","energy","loudness","speechiness","acousticness",
+                "instrumentalness","liveness","valence","tempo"]
+# Compact mode keeps only these columns; the categorical ones repeat heavily across rows.
+COMPACT_COLS = TEXT_COLS + FEATURE_COLS + ["popularity", "duration_ms", "explicit", "key", "mode", "time_signature"]
+CATEGORICAL_COLS = ["artists", "album_name", "track_genre"]
+
+
+def _read_compact(path):
+    """Projected, explicitly typed read through the pyarrow CSV engine."""
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = {raw: raw.strip() for raw in header if raw.strip() in COMPACT_COLS}
+    dtypes = {raw: ("string[pyarrow]" if name in TEXT_COLS else "float32")
+              for raw, name in wanted.items() if name != "explicit"}
+    try:
+        return pd.read_csv(path, engine="pyarrow", usecols=list(wanted), dtype=dtypes)
+    except (ValueError, pa.ArrowInvalid):
+        # Malformed numbers: take the tolerant path and let load_data coerce them.
+        return pd.read_csv(path, usecols=list(wanted), low_memory=False)
+
+
+def load_data(path, compact=False):
+    df = _read_compact(path) if compact else pd.read_csv(path, low_memory=False)
     df.columns = [c.strip() for c in df.columns]
-    df.drop_duplicates(inplace=True)
-    df.reset_index(drop=True, inplace=True)
     for col in ["track_name", "artists", "album_name"]:
         if col in df.columns:
             df[col] = df[col].astype(str).str.strip()
@@ -16,10 +45,14 @@ def load_data(path):
     for col in numeric_cols:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
+    # Duplicates are judged on the cleaned values, so " Song" and "Song", or 1 and 1.0, are one row.
+    df.drop_duplicates(inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    if compact:
+        df = compact_frame(df)
     return df
 
 def preprocess_artists(df):
-    df['artists_split'] = df['artists'].apply(lambda x: [a.strip() for a in str(x).split(';') if a.strip()])
     num_cols = ["danceability","energy","loudness","speechiness","acousticness",
                 "instrumentalness","liveness","valence","tempo","popularity"]
     for col in num_cols:
@@ -32,3 +65,568 @@ def preprocess_artists(df):
         else:
             df['popularity'] = 50.0
     return df
+
+
+class ArtistIncidence:
+    """Track x artist 0/1 CSR matrix over a sorted artist vocabulary (the `;`-separated `artists` column)."""
+
+    def __init__(self, vocab, matrix):
+        self.vocab = np.asarray(vocab, dtype=object)
+        self.matrix = csr_matrix(matrix)
+        self._by_artist = None
+
+    @classmethod
+    def from_artists(cls, artists):
+        names = pd.Series(artists).reset_index(drop=True).astype(str).str.split(";").explode().str.strip()
+        names = names[names != ""]
+        codes, vocab = pd.factorize(names, sort=True)
+        matrix = csr_matrix((np.ones(len(codes), dtype=np.float32), (names.index.to_numpy(), codes)),
+                            shape=(len(artists), len(vocab)))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        return cls(vocab, matrix)
+
+    @property
+    def by_artist(self):
+        """Same matrix in CSC form, so each artist's rows are one contiguous slice."""
+        if self._by_artist is None:
+            self._by_artist = self.matrix.tocsc()
+            self._by_artist.sort_indices()
+        return self._by_artist
+
+    def counts(self):
+        """Tracks per artist, aligned with `vocab`."""
+        return np.diff(self.by_artist.indptr)
+
+
+def build_artist_incidence(df):
+    return ArtistIncidence.from_artists(df["artists"])
+
+
+def _track_key(df):
+    """track_id, or a casefolded name + artists key for rows without one."""
+    key = pd.Series("~" + df["track_name"].astype(str).str.casefold() + "\x1f"
+                    + df["artists"].astype(str).str.casefold(), index=df.index)
+    if "track_id" in df.columns:
+        key = df["track_id"].astype(object).where(df["track_id"].notna(), key)
+    return key
+
+
+def canonicalize_tracks(df):
+    """One row per track: rows sharing a track_id (or, without one, a name + artists key) collapse into their first.
+
+    The track's genres become a `;`-separated `track_genre`, like `artists`. Also returns
+    the canonical row of every input row, which TrackSources turns back into source rows.
+    """
+    codes, uniques = pd.factorize(_track_key(df))
+    _, first = np.unique(codes, return_index=True)
+    tracks = df.iloc[first].reset_index(drop=True)
+    if "track_genre" in df.columns:
+        pairs = pd.DataFrame({"code": codes, "genre": df["track_genre"].astype(object).to_numpy()}).dropna().drop_duplicates()
+        genres = pairs.groupby("code", sort=True)["genre"].agg(lambda g: ";".join(map(str, g)))
+        tracks["track_genre"] = genres.reindex(np.arange(len(uniques))).to_numpy()
+    return tracks, codes.astype(np.int32)
+
+
+class TrackSources:
+    """Canonical track -> rows of the deduplicated CSV it was collapsed from."""
+
+    def __init__(self, canonical_of):
+        self.canonical_of = np.asarray(canonical_of)
+        self.source_rows = np.argsort(self.canonical_of, kind="stable").astype(np.int32)
+        counts = np.bincount(self.canonical_of) if len(self.canonical_of) else np.empty(0, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def rows(self, track):
+        return self.source_rows[self.offsets[track]:self.offsets[track + 1]]
+
+
+def compact_frame(df):
+    """Categorical/Arrow strings for text, float32 audio features, smallest ints for integral columns."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORICAL_COLS:
+            s = s.astype("category")
+        elif col in TEXT_COLS:
+            s = s.astype("string[pyarrow]")
+        elif col in FEATURE_COLS and pd.api.types.is_float_dtype(s):
+            s = s.astype("float32")
+        elif pd.api.types.is_float_dtype(s) and s.notna().all() and np.array_equal(s, np.round(s)):
+            s = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            s = s.astype("float32")
+        elif pd.api.types.is_integer_dtype(s):
+            s = pd.to_numeric(s, downcast="integer")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_report(before, after):
+    """Per-column dtype and deep memory use of two versions of a frame, with a total row."""
+    used_before = before.memory_usage(deep=True, index=False)
+    used_after = after.memory_usage(deep=True, index=False).reindex(used_before.index)
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "dtype_after": after.dtypes.reindex(used_before.index).astype(str).replace("nan", "(dropped)"),
+        "bytes_before": used_before,
+        "bytes_after": used_after,
+    })
+    report.loc["total"] = ["", "", used_before.sum(), used_after.sum()]
+    report["saved_pct"] = (1 - report["bytes_after"] / report["bytes_before"]) * 100
+    return report
+
+
+def cache_dir_for(path, cache_dir=None):
+    """Directory holding prepared-data caches for the CSV at `path`."""
+    return cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+
+
+def file_digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _scratch_path(path, suffix):
+    # Streamlit sessions are threads of one process, so the pid alone is not unique.
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.{suffix}"
+
+
+def _write_atomic(path, write):
+    tmp = _scratch_path(path, "tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def csv_cache_key(path, cache_dir=None):
+    """Content hash of the CSV; re-hashed only when its size or mtime changed since the last call."""
+    cache_dir = cache_dir_for(path, cache_dir)
+    stat = os.stat(path)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    entry = manifest.get(os.path.abspath(path))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+    digest = file_digest(path)
+    manifest[os.path.abspath(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+    _write_atomic(manifest_path, write)
+    return digest
+
+
+def _cache_prefix(path, compact=False):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{'compact' if compact else 'prepared'}-v"
+
+
+def prepared_cache_path(path, key, cache_dir=None, compact=False):
+    name = f"{_cache_prefix(path, compact)}{CACHE_VERSION}-{key[:16]}.arrow"
+    return os.path.join(cache_dir_for(path, cache_dir), name)
+
+
+def _fingerprint(key, compact=False):
+    return f"{key[:16]}-v{CACHE_VERSION}{'-compact' if compact else ''}"
+
+
+def cached_fingerprints(path, cache_dir=None):
+    """Fingerprints of the prepared caches of path on disk, in either layout."""
+    try:
+        names = os.listdir(cache_dir_for(path, cache_dir))
+    except OSError:
+        return set()
+    found = set()
+    for compact in (False, True):
+        prefix = f"{_cache_prefix(path, compact)}{CACHE_VERSION}-"
+        found.update(_fingerprint(n[len(prefix):-len(".arrow")], compact)
+                     for n in names if n.startswith(prefix) and n.endswith(".arrow"))
+    return found
+
+
+def sources_cache_path(cache_path):
+    return cache_path[:-len(".arrow")] + ".sources.npy"
+
+
+def _remove_stale_caches(cache_path, prefix):
+    folder, name = os.path.split(cache_path)
+    keep = {name, os.path.basename(sources_cache_path(cache_path))}
+    for other in os.listdir(folder):
+        if other.startswith(prefix) and other.endswith((".arrow", ".sources.npy")) and other not in keep:
+            try:
+                os.remove(os.path.join(folder, other))
+            except OSError:
+                pass
+
+
+def write_prepared(df, cache_path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(tmp):
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    _write_atomic(cache_path, write)
+
+
+def read_prepared(cache_path):
+    """Memory-maps an uncompressed Arrow file; numeric columns come back as zero-copy, read-only views."""
+    with pa.memory_map(cache_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    # Arrow-backed string columns are written as large_string; keep them Arrow-backed on the way back.
+    return table.to_pandas(split_blocks=True, types_mapper={pa.large_string(): pd.StringDtype("pyarrow")}.get)
+
+
+def _append_run(runs, hashes):
+    """Adds sorted unique hashes to a list of sorted runs, merging equal-sized runs (LSM style)."""
+    runs.append(hashes)
+    while len(runs) > 1 and len(runs[-1]) >= len(runs[-2]):
+        newest = runs.pop()
+        runs[-1] = np.union1d(runs[-1], newest)
+
+
+def _seen(runs, hashes):
+    seen = np.zeros(len(hashes), dtype=bool)
+    for run in runs:
+        pos = np.searchsorted(run, hashes)
+        seen |= run[np.minimum(pos, len(run) - 1)] == hashes
+    return seen
+
+
+def _iter_frames(arrow_path):
+    with pa.memory_map(arrow_path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas()
+
+
+def _median_bins(values, lo, hi, n_bins):
+    scaled = (values - lo) / (hi - lo) * n_bins if hi > lo else np.zeros(len(values))
+    return np.clip(scaled.astype(np.int64), 0, n_bins - 1)
+
+
+def _streaming_medians(arrow_path, stats, n_bins=1 << 16):
+    """Exact medians from two bounded passes: a histogram to find the middle bins, then their values."""
+    cols = [c for c, st in stats.items() if st["count"]]
+    hist = {c: np.zeros(n_bins, dtype=np.int64) for c in cols}
+    for frame in _iter_frames(arrow_path):
+        for c in cols:
+            v = frame[c].dropna().to_numpy(dtype=np.float64)
+            hist[c] += np.bincount(_median_bins(v, stats[c]["min"], stats[c]["max"], n_bins), minlength=n_bins)
+    targets = {}
+    for c in cols:
+        count = stats[c]["count"]
+        cum = np.cumsum(hist[c])
+        ranks = [(count - 1) // 2, count // 2]
+        bins = [int(np.searchsorted(cum, r, side="right")) for r in ranks]
+        before = {b: int(cum[b] - hist[c][b]) for b in bins}
+        targets[c] = (ranks, bins, before, [])
+    for frame in _iter_frames(arrow_path):
+        for c in cols:
+            v = frame[c].dropna().to_numpy(dtype=np.float64)
+            keep = np.isin(_median_bins(v, stats[c]["min"], stats[c]["max"], n_bins), targets[c][1])
+            targets[c][3].append(v[keep])
+    medians = {}
+    for c in cols:
+        ranks, bins, before, parts = targets[c]
+        values = np.concatenate(parts)
+        picked = []
+        for rank, b in zip(ranks, bins):
+            in_bin = np.sort(values[_median_bins(values, stats[c]["min"], stats[c]["max"], n_bins) == b])
+            picked.append(in_bin[rank - before[b]])
+        medians[c] = (picked[0] + picked[1]) / 2
+    return medians
+
+
+def _assign_codes(keys, hashes):
+    """Track codes for one chunk's key hashes, numbering unseen keys in order of first appearance.
+
+    keys is [sorted hashes, their codes] for every chunk so far and is updated in place.
+    Also returns the chunk rows that first introduce a key, in row (and so code) order.
+    """
+    known, known_codes = keys
+    uniq, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    pos = np.searchsorted(known, uniq)
+    found = known[np.minimum(pos, len(known) - 1)] == uniq if len(known) else np.zeros(len(uniq), dtype=bool)
+    codes = np.empty(len(uniq), dtype=np.int64)
+    codes[found] = known_codes[pos[found]]
+    fresh = np.flatnonzero(~found)
+    fresh = fresh[np.argsort(first[fresh], kind="stable")]
+    codes[fresh] = len(known) + np.arange(len(fresh))
+    keys[0] = np.insert(known, pos[~found], uniq[~found])
+    keys[1] = np.insert(known_codes, pos[~found], codes[~found])
+    return codes[inverse.ravel()], first[fresh]
+
+
+def _genre_pairs(codes, genres, genre_ids):
+    """(code << 32 | genre id) for the rows with a genre; genre_ids grows with unseen genres."""
+    values = genres.astype(object).to_numpy()
+    has = pd.notna(values)
+    inverse, uniques = pd.factorize(values[has])
+    lut = np.array([genre_ids.setdefault(g, len(genre_ids)) for g in uniques], dtype=np.int64)
+    return (codes[has] << 32) | lut[inverse]
+
+
+def _joined_genres(pair_parts, genre_ids, n_tracks):
+    """`;`-joined genres of every track in order of first appearance (NaN without any), like canonicalize_tracks."""
+    pairs = np.concatenate(pair_parts)
+    _, first = np.unique(pairs, return_index=True)
+    pairs = pairs[np.sort(first)]
+    pairs = pairs[np.argsort(pairs >> 32, kind="stable")]
+    offsets = np.searchsorted(pairs >> 32, np.arange(n_tracks + 1))
+    names = np.array([str(g) for g in genre_ids], dtype=object)
+    ids = pairs & 0xFFFFFFFF
+    return np.array([";".join(names[ids[offsets[t]:offsets[t + 1]]]) if offsets[t + 1] > offsets[t] else np.nan
+                     for t in range(n_tracks)], dtype=object)
+
+
+def _stage_schema(table):
+    # A column that is all-null in the first chunk is still text in later ones.
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+
+
+KIND_TYPES = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "object": pa.string()}
+
+
+def _chunk_kind(column):
+    """"int", "float", "bool" or "object": how read_csv typed one chunk's column (None if all null)."""
+    if column.isna().all():
+        return None
+    if pd.api.types.is_bool_dtype(column):
+        return "bool"
+    if pd.api.types.is_integer_dtype(column):
+        return "int"
+    if pd.api.types.is_float_dtype(column):
+        return "float"
+    # Booleans with gaps come back as objects.
+    return "bool" if pd.api.types.infer_dtype(column, skipna=True) == "boolean" else "object"
+
+
+def _widen(kind, other):
+    if kind is None or kind == other:
+        return other
+    if other is None:
+        return kind
+    return "float" if {kind, other} == {"int", "float"} else "object"
+
+
+def ingest_streaming(path, cache_path, chunksize=100000):
+    """load_data + preprocess_artists + canonicalize_tracks over CSV chunks, written to cache_path.
+
+    Writes the prepared Arrow file and, before it, its sources map (sources_cache_path).
+    A first pass lets read_csv type each chunk and widens the column types across chunks
+    into those read_csv gives the whole file; the second reads chunks with those types,
+    cleans them as load_data does and deduplicates rows across chunks by a 64-bit hash
+    of the cleaned values kept in sorted runs. The median fill values come from bounded
+    passes over an intermediate Arrow file. Tracks are then keyed by a 64-bit hash of
+    their track key, each keeping its first-seen row, and their genres are gathered as
+    (track, genre) id pairs and joined in a last pass. Peak memory is about one chunk
+    plus some 30 bytes per distinct row instead of the whole catalogue.
+    """
+    num_cols = ["danceability","energy","loudness","speechiness","acousticness",
+                "instrumentalness","liveness","valence","tempo","popularity"]
+    kinds, has_null = {}, {}
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        for col in chunk.columns:
+            kinds[col] = _widen(kinds.get(col), _chunk_kind(chunk[col]))
+            has_null[col] = has_null.get(col, False) or bool(chunk[col].isna().any())
+    # As in read_csv: all-null columns are float, and a missing value makes an int column float.
+    kinds = {col: "float" if kind is None or (kind == "int" and has_null[col]) else kind for col, kind in kinds.items()}
+    dtypes = {col: ("boolean" if has_null[col] else bool) if kind == "bool" else
+              {"int": "int64", "float": "float64", "object": str}[kind] for col, kind in kinds.items()}
+    cleaned = {}
+    for raw, kind in kinds.items():
+        name = raw.strip()
+        if name in ["track_name", "artists", "album_name"]:
+            kind = "object"
+        elif name in num_cols and kind in ("bool", "object"):
+            kind = "float"
+        cleaned[name] = kind
+    schema = pa.schema([pa.field(name, KIND_TYPES[kind]) for name, kind in cleaned.items()])
+    intermediate = _scratch_path(cache_path, "stage")
+    tracks_stage = _scratch_path(cache_path, "tracks")
+    stats = {}
+    runs, writer, sink = [], None, None
+    try:
+        sink = pa.OSFile(intermediate, "wb")
+        writer = pa.ipc.new_file(sink, schema)
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtypes):
+            chunk.columns = [c.strip() for c in chunk.columns]
+            for col in ["track_name", "artists", "album_name"]:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype(str).str.strip()
+            for col in num_cols:
+                if col in chunk.columns:
+                    # One dtype for every chunk: 44 and 44.0 hash differently.
+                    chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype(
+                        "int64" if cleaned[col] == "int" else "float64")
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            fresh = ~_seen(runs, hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+            chunk = chunk[fresh]
+            _append_run(runs, np.unique(hashes[fresh]))
+            for col in num_cols:
+                if cleaned.get(col) == "float":
+                    v = chunk[col].dropna().to_numpy(dtype=np.float64)
+                    st = stats.setdefault(col, {"count": 0, "min": np.inf, "max": -np.inf})
+                    st["count"] += len(v)
+                    if len(v):
+                        st["min"], st["max"] = min(st["min"], v.min()), max(st["max"], v.max())
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        writer.close()
+        writer = None
+        sink.close()
+        medians = _streaming_medians(intermediate, stats)
+
+        keys = [np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)]
+        canonical_parts, pair_parts, genre_ids = [], [], {}
+        with pa.OSFile(tracks_stage, "wb") as out:
+            out_writer, out_schema = None, None
+            for frame in _iter_frames(intermediate):
+                for col, median in medians.items():
+                    frame[col] = frame[col].fillna(median)
+                if "popularity" not in frame.columns:
+                    feature_cols = [c for c in ["danceability","energy","valence","tempo"] if c in frame.columns]
+                    frame["popularity"] = frame[feature_cols].mean(axis=1) if feature_cols else 50.0
+                codes, first_rows = _assign_codes(keys, pd.util.hash_array(_track_key(frame).to_numpy(dtype=object)))
+                canonical_parts.append(codes.astype(np.int32))
+                if "track_genre" in frame.columns:
+                    pair_parts.append(_genre_pairs(codes, frame["track_genre"], genre_ids))
+                table = pa.Table.from_pandas(frame.iloc[first_rows], preserve_index=False)
+                if out_writer is None:
+                    out_schema = _stage_schema(table)
+                    out_writer = pa.ipc.new_file(out, out_schema)
+                out_writer.write_table(table.cast(out_schema))
+            out_writer.close()
+        canonical_of = np.concatenate(canonical_parts)
+        genres = _joined_genres(pair_parts, genre_ids, len(keys[0])) if pair_parts else None
+
+        def write_sources(tmp):
+            with open(tmp, "wb") as f:
+                np.save(f, canonical_of)
+
+        def write(tmp):
+            out_writer, out_schema, start = None, None, 0
+            with pa.OSFile(tmp, "wb") as out:
+                for frame in _iter_frames(tracks_stage):
+                    if genres is not None:
+                        frame["track_genre"] = genres[start:start + len(frame)]
+                    start += len(frame)
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if out_writer is None:
+                        out_schema = _stage_schema(table)
+                        out_writer = pa.ipc.new_file(out, out_schema)
+                    out_writer.write_table(table.cast(out_schema))
+                out_writer.close()
+        # Sources first, as in _load_prepared: a published Arrow file always has its map next to it.
+        _write_atomic(sources_cache_path(cache_path), write_sources)
+        _write_atomic(cache_path, write)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None and not sink.closed:
+            sink.close()
+        for scratch in (intermediate, tracks_stage):
+            if os.path.exists(scratch):
+                os.remove(scratch)
+    return cache_path
+
+
+# Frames load_prepared returned, by id. pandas copies attrs into slices and derived
+# frames, so the fingerprint in attrs only identifies the frame it was set on.
+_PREPARED = {}
+
+
+def _mark_prepared(df, fingerprint):
+    df.attrs["fingerprint"] = fingerprint
+    key = id(df)
+    _PREPARED[key] = weakref.ref(df, lambda _, key=key: _PREPARED.pop(key, None))
+
+
+def dataset_fingerprint(df):
+    """Cache key of a frame: the fingerprint load_prepared gave it, or a hash of its contents for any other frame.
+
+    Slices and frames derived from a prepared one carry its attrs but not its data, so they
+    are hashed rather than handed the prepared frame's cached artifacts.
+    """
+    ref = _PREPARED.get(id(df))
+    if ref is not None and ref() is df:
+        return df.attrs["fingerprint"]
+    digest = hashlib.sha1(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return f"frame-{digest.hexdigest()[:16]}"
+
+
+def _prepare_tracks(path, compact=False):
+    tracks, canonical_of = canonicalize_tracks(preprocess_artists(load_data(path, compact=compact)))
+    if compact:
+        # Popularity can only become an integer once preprocessing has filled its gaps,
+        # and the joined genres need fresh categories.
+        tracks = compact_frame(tracks)
+    return tracks, canonical_of
+
+
+def _load_prepared(path, cache_path, compact=False, streaming=False):
+    if os.path.exists(cache_path) and os.path.exists(sources_cache_path(cache_path)):
+        try:
+            return read_prepared(cache_path)
+        except (OSError, pa.ArrowInvalid):
+            pass
+    if streaming:
+        # ingest_streaming publishes both files itself and never holds the whole frame.
+        ingest_streaming(path, cache_path)
+        _remove_stale_caches(cache_path, _cache_prefix(path, compact))
+        return read_prepared(cache_path)
+    df, canonical_of = _prepare_tracks(path, compact)
+
+    def write_sources(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, canonical_of)
+    try:
+        # Sources first: a published Arrow file always has its map next to it.
+        _write_atomic(sources_cache_path(cache_path), write_sources)
+        write_prepared(df, cache_path)
+        _remove_stale_caches(cache_path, _cache_prefix(path, compact))
+    except (OSError, pa.ArrowInvalid, pa.ArrowTypeError):
+        return df
+    # Hand back the mapped copy so first and later loads behave the same and the parsed frame can be freed.
+    return read_prepared(cache_path)
+
+
+def load_prepared(path, cache_dir=None, compact=False, streaming=False):
+    """load_data + preprocess_artists + canonicalize_tracks, served from an Arrow cache keyed by the CSV's size, mtime and hash.
+
+    compact=True stores the memory-lean layout from compact_frame (and only COMPACT_COLS).
+    streaming=True builds a missing cache with ingest_streaming instead of parsing the CSV
+    in one go; it writes the default layout, so it cannot be combined with compact.
+    """
+    if compact and streaming:
+        raise ValueError("streaming ingestion writes the default layout; compact=True is not supported")
+    key = csv_cache_key(path, cache_dir)
+    df = _load_prepared(path, prepared_cache_path(path, key, cache_dir, compact), compact, streaming)
+    _mark_prepared(df, _fingerprint(key, compact))
+    return df
+
+
+def load_track_sources(path, cache_dir=None, compact=False):
+    """TrackSources for the cache load_prepared built (call load_prepared first)."""
+    key = csv_cache_key(path, cache_dir)
+    cache_path = prepared_cache_path(path, key, cache_dir, compact)
+    return TrackSources(np.load(sources_cache_path(cache_path), mmap_mode="r"))
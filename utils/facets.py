@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+
+class Facet:
+    """Inverted index for one filter: value -> sorted int32 row ids, plus the sorted option list."""
+
+    def __init__(self, rows, values):
+        rows = np.asarray(rows, dtype=np.int32)
+        codes, vocab = pd.factorize(pd.Series(values), sort=True)
+        valid = codes >= 0
+        rows, codes = rows[valid], codes[valid]
+        order = np.lexsort((rows, codes))
+        self.options = vocab.tolist()
+        self.keys = pd.Index(vocab)
+        self.postings = rows[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(vocab)))])
+
+    def rows(self, selected):
+        """Sorted row ids matching any of the selected values."""
+        positions = self.keys.get_indexer(list(selected))
+        parts = [self.postings[self.offsets[p]:self.offsets[p + 1]] for p in positions if p >= 0]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+
+def build_facets(df, incidence):
+    """Artist / Album / Genre facets for the Preferences filters; artists come from the incidence matrix.
+
+    `track_genre` holds every genre of the track, `;`-separated, and each one is its own option.
+    """
+    by_artist = incidence.by_artist
+    artist_codes = np.repeat(np.arange(len(incidence.vocab)), np.diff(by_artist.indptr))
+    facets = {"Artist": Facet(by_artist.indices, incidence.vocab[artist_codes])}
+    if "album_name" in df.columns:
+        facets["Album"] = Facet(np.arange(len(df)), df["album_name"].to_numpy())
+    if "track_genre" in df.columns:
+        genres = pd.Series(df["track_genre"].to_numpy(dtype=object)).str.split(";").explode()
+        facets["Genre"] = Facet(genres.index.to_numpy(), genres.to_numpy())
+    return facets
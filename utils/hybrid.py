@@ -0,0 +1,69 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+# One-pass hybrid ranking for a batch of seed sets. For every candidate track:
+#
+#   score = w_sim * cosine + w_rule * artist-rule boost + w_pop * popularity prior
+#
+# cosine is the best match against any seed in the set; the rule boost sums the
+# lift of every rule leading from a seed artist to one of the candidate's
+# artists (artist -> consequent matrix from apriori_artist.rules_to_matrix),
+# scaled to [0, 1] per set; the prior is popularity scaled to [0, 1]. All seed
+# sets are scored together by one dense and two sparse products, and top-k is
+# an argpartition per column. Pass normalized=True with vectors that are already
+# unit rows (registry.get_hybrid_ranker hands in the shared, read-only matrix)
+# and the ranker keeps a reference instead of a private copy.
+
+DEFAULT_WEIGHTS = {"similarity": 1.0, "rules": 0.3, "popularity": 0.1}
+
+
+class HybridRanker:
+    def __init__(self, vectors, incidence, rule_matrix, popularity, normalized=False):
+        self.vectors = vectors if normalized else normalize(np.asarray(vectors, dtype=np.float32))
+        self.incidence = incidence
+        self.rule_matrix = csr_matrix(rule_matrix, dtype=np.float32)
+        popularity = np.asarray(popularity, dtype=np.float32)
+        span = np.ptp(popularity) if len(popularity) else 0.0
+        self.prior = (popularity - popularity.min()) / span if span > 0 else np.zeros(len(popularity), dtype=np.float32)
+
+    def scores(self, seed_sets, weights=None):
+        """(n_rows, len(seed_sets)) float32 hybrid scores."""
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        seeds = np.concatenate([np.asarray(s, dtype=np.int64) for s in seed_sets])
+        set_of_seed = np.repeat(np.arange(len(seed_sets)), [len(s) for s in seed_sets])
+        # seed_sets x seeds membership, used to pool per-seed columns into their set.
+        membership = csr_matrix((np.ones(len(seeds), dtype=np.float32), (set_of_seed, np.arange(len(seeds)))),
+                                shape=(len(seed_sets), len(seeds)))
+        similarity = self.vectors @ self.vectors[seeds].T
+        pooled = np.full((len(self.vectors), len(seed_sets)), -np.inf, dtype=np.float32)
+        for col, set_id in enumerate(set_of_seed):
+            np.maximum(pooled[:, set_id], similarity[:, col], out=pooled[:, set_id])
+        total = weights["similarity"] * pooled
+        if weights["rules"]:
+            seed_artists = (membership @ self.incidence.matrix[seeds]).astype(bool).astype(np.float32)
+            boost = (self.incidence.matrix @ (seed_artists @ self.rule_matrix).T)
+            boost = np.asarray(boost.toarray() if hasattr(boost, "toarray") else boost, dtype=np.float32)
+            top = boost.max(axis=0)
+            total += weights["rules"] * np.divide(boost, top, out=np.zeros_like(boost), where=top > 0)
+        if weights["popularity"]:
+            total += weights["popularity"] * self.prior[:, None]
+        return total
+
+    def recommend(self, seed_sets, n_neighbors, exclude_rows=(), weights=None):
+        """Top n_neighbors row ids per seed set, best first, never returning seeds or exclude_rows."""
+        if len(seed_sets) == 0:
+            return []
+        total = self.scores(seed_sets, weights)
+        total[np.asarray(exclude_rows, dtype=np.int64)] = -np.inf
+        results = []
+        for col, seeds in enumerate(seed_sets):
+            column = total[:, col].copy()
+            column[np.asarray(seeds, dtype=np.int64)] = -np.inf
+            k = min(n_neighbors, int(np.isfinite(column).sum()))
+            if k == 0:
+                results.append(np.empty(0, dtype=np.int64))
+                continue
+            top = np.argpartition(-column, k - 1)[:k]
+            results.append(top[np.argsort(-column[top], kind="stable")].astype(np.int64))
+        return results
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import threading
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.preprocessing import normalize
+from utils.recommender import top_k_similar
+
+# Offline item-to-item table: the top-k cosine neighbours of every track, stored as
+# fixed-width int32 ids and float16 scores in two .npy files. Serving memory-maps
+# them, so a lookup is one row read and every Streamlit worker on the host shares
+# the same pages through the OS page cache.
+#
+# Build for the bundled dataset with:  python -m utils.neighbor_table [k]
+
+TABLE_VERSION = 1
+
+
+def _fill_rows(vectors, indices_path, scores_path, start, stop, k):
+    top_idx, top_scores = top_k_similar(vectors, np.arange(start, stop), n=k)
+    indices = np.load(indices_path, mmap_mode="r+")
+    scores = np.load(scores_path, mmap_mode="r+")
+    indices[start:stop] = top_idx
+    scores[start:stop] = top_scores
+    indices.flush()
+    scores.flush()
+
+
+def build_neighbor_table(vectors, out_dir, k=50, chunk_size=2048, n_jobs=-1, fingerprint=None):
+    """Computes the table in parallel row chunks and publishes it atomically at out_dir."""
+    vectors = normalize(vectors.astype(np.float32), copy=True)
+    n_rows = vectors.shape[0]
+    k = min(k, n_rows - 1)
+    tmp = f"{out_dir}.{os.getpid()}-{threading.get_ident()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        indices_path = os.path.join(tmp, "indices.npy")
+        scores_path = os.path.join(tmp, "scores.npy")
+        np.lib.format.open_memmap(indices_path, mode="w+", dtype=np.int32, shape=(n_rows, k)).flush()
+        np.lib.format.open_memmap(scores_path, mode="w+", dtype=np.float16, shape=(n_rows, k)).flush()
+        Parallel(n_jobs=n_jobs)(
+            delayed(_fill_rows)(vectors, indices_path, scores_path, start, min(start + chunk_size, n_rows), k)
+            for start in range(0, n_rows, chunk_size)
+        )
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"version": TABLE_VERSION, "k": k, "n_rows": n_rows, "fingerprint": fingerprint}, f, indent=2)
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        os.rename(tmp, out_dir)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return NeighborTable(out_dir)
+
+
+class NeighborTable:
+    def __init__(self, folder):
+        with open(os.path.join(folder, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != TABLE_VERSION:
+            raise ValueError(f"neighbour table at {folder} has version {self.meta.get('version')}, expected {TABLE_VERSION}")
+        self.indices = np.load(os.path.join(folder, "indices.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(folder, "scores.npy"), mmap_mode="r")
+
+    @property
+    def k(self):
+        return self.meta["k"]
+
+    def __len__(self):
+        return self.meta["n_rows"]
+
+    def lookup(self, row, n=None):
+        """(ids, scores) of the stored neighbours of `row`, best first."""
+        n = n or self.k
+        return np.asarray(self.indices[row, :n]), np.asarray(self.scores[row, :n], dtype=np.float32)
+
+    def neighbors_excluding(self, seed_rows, n_neighbors, exclude_rows=()):
+        """Same contract as ann.kneighbors_excluding, or None if the table is too narrow for some seed."""
+        exclude_rows = np.union1d(np.asarray(exclude_rows, dtype=np.int64), np.asarray(seed_rows, dtype=np.int64))
+        results = []
+        for row in seed_rows:
+            ids = np.asarray(self.indices[row])
+            ids = ids[~np.isin(ids, exclude_rows)][:n_neighbors]
+            if len(ids) < n_neighbors:
+                return None
+            results.append(ids.astype(np.int64))
+        return results
+
+
+def load_neighbor_table(folder):
+    try:
+        return NeighborTable(folder)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+    from utils.data_loader import dataset_fingerprint
+    from utils.registry import get_dataset, numeric_columns, get_scaled_features, neighbor_table_dir
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    df = get_dataset()
+    numeric_cols = numeric_columns(df)
+    _, scaled = get_scaled_features(df, numeric_cols)
+    out_dir = neighbor_table_dir(df, numeric_cols, k)
+    table = build_neighbor_table(scaled, out_dir, k=k, fingerprint=dataset_fingerprint(df))
+    print(f"wrote {len(table):,} x {table.k} neighbour table to {out_dir}")
@@ -1,11 +1,199 @@
-from sklearn.cluster import KMeans
+import threading
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import davies_bouldin_score, silhouette_score
+from sklearn.preprocessing import StandardScaler
+import numpy as np
 import pandas as pd
 
-def build_clusters(df, n_clusters=3, audio_cols=None):
+# K-means engine behind the playlist page. "full" is Lloyd KMeans, "minibatch" is
+# MiniBatchKMeans; "auto" picks full up to FULL_MAX_ROWS rows and otherwise
+# mini-batches on a SAMPLE_SIZE subsample, then assigns every row to the nearest
+# centre. A ClusterEngine remembers the centres of each k it has fitted and seeds
+# a new mini-batch fit from the closest one (merging or splitting centres), so
+# moving the cluster slider refines an existing solution instead of starting
+# over. A warm start runs one initialisation instead of three; full Lloyd fits
+# are cheap at their size and always keep k-means++ with ten restarts.
+
+FULL_MAX_ROWS = 50000
+SAMPLE_SIZE = 100000
+METHODS = ("auto", "full", "minibatch")
+
+
+def fit_clusters(X, n_clusters, method="auto", init=None, sample_size=None, random_state=42):
+    """(model, int32 labels for every row of X); fits on a subsample when sample_size is below len(X)."""
+    if method not in METHODS:
+        raise ValueError(f"unknown clustering method {method!r}; expected one of {METHODS}")
+    n_rows = len(X)
+    if method == "auto" and sample_size is None and n_rows > SAMPLE_SIZE:
+        sample_size = SAMPLE_SIZE
+    method = _resolved_method(method, n_rows)
+    fit_X = X
+    if sample_size and sample_size < n_rows:
+        rng = np.random.default_rng(random_state)
+        fit_X = X[np.sort(rng.choice(n_rows, sample_size, replace=False))]
+    n_init = 1 if init is not None else (10 if method == "full" else 3)
+    init = "k-means++" if init is None else init
+    if method == "full":
+        model = KMeans(n_clusters=n_clusters, init=init, n_init=n_init, random_state=random_state)
+    else:
+        model = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=n_init, batch_size=4096, random_state=random_state)
+    model.fit(fit_X)
+    labels = model.labels_ if fit_X is X else model.predict(X)
+    return model, labels.astype(np.int32)
+
+
+def _resolved_method(method, n_rows):
+    return ("full" if n_rows <= FULL_MAX_ROWS else "minibatch") if method == "auto" else method
+
+
+def _warm_centers(centers, counts, X, n_clusters, random_state=42, sample_size=20000):
+    """Initial centres for n_clusters derived from a solution with a different k."""
+    if len(centers) == n_clusters:
+        return centers
+    if len(centers) > n_clusters:
+        # Merge: cluster the old centres, weighted by how many rows each one held.
+        merge = KMeans(n_clusters=n_clusters, n_init=1, random_state=random_state)
+        return merge.fit(centers, sample_weight=counts).cluster_centers_
+    # Split: keep the old centres and add new ones by k-means++ (D^2) sampling.
+    rng = np.random.default_rng(random_state)
+    sample = np.asarray(X[np.sort(rng.choice(len(X), min(len(X), sample_size), replace=False))], dtype=np.float64)
+    d2 = ((sample[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    grown = [c for c in centers]
+    for _ in range(n_clusters - len(centers)):
+        total = d2.sum()
+        pick = rng.choice(len(sample), p=d2 / total) if total > 0 else rng.integers(len(sample))
+        grown.append(sample[pick])
+        d2 = np.minimum(d2, ((sample - sample[pick]) ** 2).sum(axis=1))
+    return np.asarray(grown)
+
+
+def _fit_and_score(X, n_clusters, method, metric_rows, random_state):
+    model, labels = fit_clusters(X, n_clusters, method=method, random_state=random_state)
+    # Inertia over every row (the model's own is only over its fit sample); quality scores over a sample.
+    inertia = -model.score(X)
+    silhouette = davies_bouldin = np.nan
+    sample_labels = labels[metric_rows]
+    if 1 < len(np.unique(sample_labels)) < len(metric_rows):
+        sample = X[metric_rows]
+        silhouette = silhouette_score(sample, sample_labels)
+        davies_bouldin = davies_bouldin_score(sample, sample_labels)
+    return model, labels, {"k": n_clusters, "inertia": inertia, "silhouette": silhouette, "davies_bouldin": davies_bouldin}
+
+
+def sweep_clusters(X, ks, method="auto", metric_sample=10000, n_jobs=-1, random_state=42):
+    """Fits every k in parallel; returns ({k: (model, labels)}, metrics DataFrame indexed by k).
+
+    Silhouette (higher is better) and Davies-Bouldin (lower is better) are measured on
+    the same metric_sample rows for every k so the scores are comparable.
+    """
+    rng = np.random.default_rng(random_state)
+    metric_rows = np.sort(rng.choice(len(X), min(len(X), metric_sample), replace=False))
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score)(X, k, method, metric_rows, random_state) for k in ks
+    )
+    fitted = {row["k"]: (model, labels) for model, labels, row in results}
+    metrics = pd.DataFrame([row for _, _, row in results]).set_index("k").sort_index()
+    return fitted, metrics
+
+
+def suggest_k(metrics):
+    """The k with the best silhouette (the smaller k on ties), or None if no k could be scored."""
+    scored = metrics["silhouette"].dropna()
+    if scored.empty:
+        return None
+    return int(scored[scored == scored.max()].index.min())
+
+
+class ClusterEngine:
+    def __init__(self, X, method="auto", sample_size=None, random_state=42):
+        self.X = X
+        self.method = method
+        self.sample_size = sample_size
+        self.random_state = random_state
+        self.solutions = {}
+        # One engine is shared by every session, so solutions is only touched under the lock.
+        self._lock = threading.Lock()
+
+    def remember(self, n_clusters, model, labels):
+        counts = np.bincount(np.asarray(labels), minlength=n_clusters).astype(np.float64)
+        with self._lock:
+            self.solutions[n_clusters] = (np.asarray(model.cluster_centers_, dtype=np.float64), counts)
+
+    def nearest(self, n_clusters):
+        """The fitted k closest to n_clusters (preferring the larger on ties), or None."""
+        with self._lock:
+            if not self.solutions:
+                return None
+            return min(self.solutions, key=lambda k: (abs(k - n_clusters), -k))
+
+    def warm_init(self, n_clusters):
+        """Initial centres for n_clusters from the nearest fitted k, or None for a cold k-means++ fit."""
+        if _resolved_method(self.method, len(self.X)) == "full":
+            return None
+        near = self.nearest(n_clusters)
+        if near is None:
+            return None
+        with self._lock:
+            centers, counts = self.solutions[near]
+        return _warm_centers(centers, counts, self.X, n_clusters, self.random_state)
+
+    def fit(self, n_clusters, init="warm"):
+        """Fits n_clusters from `init` (warm_init by default) and remembers the solution."""
+        if isinstance(init, str) and init == "warm":
+            init = self.warm_init(n_clusters)
+        model, labels = fit_clusters(self.X, n_clusters, self.method, init, self.sample_size, self.random_state)
+        self.remember(n_clusters, model, labels)
+        return model, labels
+
+
+class ClusterIndex:
+    """Immutable cluster -> row ids, each cluster's rows ordered by distance to its centre (closest first)."""
+
+    def __init__(self, labels, X, centers, chunk_size=100000):
+        labels = np.asarray(labels)
+        centers = np.asarray(centers, dtype=np.float32)
+        distances = np.empty(len(labels), dtype=np.float32)
+        for start in range(0, len(labels), chunk_size):
+            stop = start + chunk_size
+            diff = np.asarray(X[start:stop], dtype=np.float32) - centers[labels[start:stop]]
+            distances[start:stop] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        order = np.lexsort((distances, labels))
+        self.rows = order.astype(np.int32)
+        self.distances = distances[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(centers)))])
+        self.labels = labels
+        for arr in (self.rows, self.distances, self.offsets):
+            arr.flags.writeable = False
+
+    @property
+    def n_clusters(self):
+        return len(self.offsets) - 1
+
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def members(self, cluster):
+        """Row ids of one cluster, closest to the centre first."""
+        return self.rows[self.offsets[cluster]:self.offsets[cluster + 1]]
+
+    def playlist(self, cluster, n, exclude_rows=(), rank="centroid", random_state=42):
+        """Up to n rows of `cluster` not in exclude_rows: the n closest to the centre, or a random sample."""
+        rows = self.members(cluster)
+        if len(exclude_rows):
+            rows = rows[~np.isin(rows, exclude_rows)]
+        if rank == "random" and len(rows) > n:
+            rng = np.random.default_rng(random_state)
+            return rows[np.sort(rng.choice(len(rows), n, replace=False))]
+        return rows[:n]
+
+
+def build_clusters(df, n_clusters=3, audio_cols=None, method="auto"):
     if audio_cols is None:
         audio_cols = ["danceability","energy","loudness","speechiness","acousticness",
                       "instrumentalness","liveness","valence","tempo"]
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    df['cluster'] = kmeans.fit_predict(df[audio_cols])
-    centroids = pd.DataFrame(kmeans.cluster_centers_, columns=audio_cols)
-    return df, centroids
+    scaler = StandardScaler()
+    scaled = scaler.fit_transform(df[audio_cols].to_numpy(dtype="float32"))
+    model, labels = fit_clusters(scaled, n_clusters, method=method)
+    centroids = pd.DataFrame(scaler.inverse_transform(model.cluster_centers_), columns=audio_cols)
+    return df.assign(cluster=labels), centroids
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# Data prep for catalogue-wide charts, so what reaches Plotly stays the same size
+# however large the catalogue grows: a fixed-size sample that keeps every cluster
+# visible, or a fixed grid of density cells. The built figures themselves are
+# cached per dataset by registry.get_figure.
+
+
+def stratified_rows(labels, n_total=1000, min_per_group=25, random_state=42):
+    """Sorted row ids sampling every label: a proportional share of n_total, but at least min_per_group each."""
+    labels = np.asarray(labels)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    share = np.minimum(np.maximum(min_per_group, (n_total * counts) // max(counts.sum(), 1)), counts)
+    order = np.argsort(inverse, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    rng = np.random.default_rng(random_state)
+    picked = [order[offsets[g]:offsets[g + 1]][rng.choice(counts[g], share[g], replace=False)]
+              for g in range(len(counts))]
+    return np.sort(np.concatenate(picked)) if picked else np.empty(0, dtype=np.int64)
+
+
+def binned_density(X, columns, bins=24, labels=None):
+    """Non-empty cells of a bins^d grid over the columns of X: cell centres, row count and most common label."""
+    X = np.asarray(X, dtype=np.float64)
+    lo, hi = np.nanmin(X, axis=0), np.nanmax(X, axis=0)
+    width = np.where(hi > lo, (hi - lo) / bins, 1.0)
+    cell = np.clip(((X - lo) / width).astype(np.int64), 0, bins - 1)
+    shape = (bins,) * X.shape[1]
+    cells, inverse, counts = np.unique(np.ravel_multi_index(cell.T, shape), return_inverse=True, return_counts=True)
+    centres = lo + (np.column_stack(np.unravel_index(cells, shape)) + 0.5) * width
+    out = pd.DataFrame(centres, columns=list(columns))
+    out["count"] = counts
+    if labels is not None:
+        codes, uniques = pd.factorize(np.asarray(labels), sort=True)
+        votes = np.bincount(inverse * len(uniques) + codes, minlength=len(cells) * len(uniques))
+        out["label"] = np.asarray(uniques)[votes.reshape(len(cells), len(uniques)).argmax(axis=1)]
+    return out
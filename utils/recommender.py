@@ -1,26 +1,132 @@
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import StandardScaler
-from scipy.sparse import hstack, csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler, normalize
+from scipy.sparse import hstack, vstack, csr_matrix, issparse
 import numpy as np
+from utils.artifact_store import load_artifacts, save_artifacts
 
-def build_feature_matrix(df):
-    text_col = "text_blob"
-    tfidf = TfidfVectorizer(max_features=4000, ngram_range=(1, 2))
-    tfidf_matrix = tfidf.fit_transform(df[text_col])
-    
-    audio_cols = ["danceability","energy","loudness","speechiness","acousticness",
-                  "instrumentalness","liveness","valence","tempo"]
+TEXT_FIELDS = ["track_name", "artists", "album_name", "track_genre"]
+AUDIO_COLS = ["danceability","energy","loudness","speechiness","acousticness",
+              "instrumentalness","liveness","valence","tempo"]
+TEXT_MODES = ("tfidf", "hashing")
+
+def text_blob(df):
+    """Track name, artists, album and genres as one string per row; `;`-separated lists become words."""
+    parts = [df[c].astype("string").fillna("").str.replace(";", " ", regex=False) for c in TEXT_FIELDS if c in df.columns]
+    blob = parts[0]
+    for part in parts[1:]:
+        blob = blob + " " + part
+    return blob
+
+def _text_column(df):
+    return df["text_blob"] if "text_blob" in df.columns else text_blob(df)
+
+def _hashed_features(df, n_features, batch_size):
+    """Batch-wise TF-IDF over hashed unigrams + bigrams: no vocabulary, float32 throughout.
+
+    The first pass hashes each batch (keeping the sparse counts) and accumulates document
+    frequencies and the audio scaler; the second applies idf and scaling batch by batch.
+    """
+    hasher = HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm=None, dtype=np.float32)
     scaler = StandardScaler()
-    audio_matrix = scaler.fit_transform(df[audio_cols])
-    combined = hstack([tfidf_matrix, csr_matrix(audio_matrix)], format="csr")
-    return combined, tfidf, scaler
+    doc_freq = np.zeros(n_features, dtype=np.int64)
+    counts = []
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        block = hasher.transform(_text_column(batch))
+        doc_freq += np.bincount(block.indices, minlength=n_features)
+        scaler.partial_fit(batch[AUDIO_COLS].to_numpy(dtype=np.float32))
+        counts.append(block)
+    tfidf = TfidfTransformer()
+    # Same smoothed idf TfidfVectorizer uses.
+    tfidf.idf_ = (np.log((1 + len(df)) / (1 + doc_freq)) + 1).astype(np.float32)
+    blocks = []
+    for i, start in enumerate(range(0, len(df), batch_size)):
+        block = counts[i]
+        block.data *= tfidf.idf_[block.indices]
+        normalize(block, copy=False)
+        audio = scaler.transform(df[AUDIO_COLS].iloc[start:start + batch_size].to_numpy(dtype=np.float32))
+        blocks.append(hstack([block, csr_matrix(audio.astype(np.float32))], format="csr", dtype=np.float32))
+        counts[i] = None
+    return vstack(blocks, format="csr", dtype=np.float32), make_pipeline(hasher, tfidf), scaler
+
+def build_feature_matrix(df, store_dir=None, fingerprint=None, mode="tfidf", n_features=2 ** 18, batch_size=100000):
+    """Returns (matrix, text_model, scaler): float32 CSR with L2-normalized rows, so cosine similarity is a plain dot product.
+
+    The text comes from `text_blob` if the frame has one, else from text_blob(df).
+    mode="tfidf" fits a 4000-term TfidfVectorizer over the corpus; mode="hashing"
+    hashes into n_features columns in batches, for catalogues too large for a vocabulary.
+    With a store_dir and fingerprint the fit is reused across restarts.
+    """
+    if mode not in TEXT_MODES:
+        raise ValueError(f"unknown text feature mode {mode!r}; expected one of {TEXT_MODES}")
+    if mode == "tfidf":
+        params = {"max_features": 4000, "ngram_range": [1, 2], "normalized": True, "dtype": "float32"}
+    else:
+        params = {"mode": mode, "n_features": n_features, "ngram_range": [1, 2], "normalized": True, "dtype": "float32"}
+    if store_dir and fingerprint:
+        stored = load_artifacts(store_dir, "text_features", fingerprint, params)
+        if stored is not None:
+            return stored["matrix"], stored["tfidf"], stored["scaler"]
+    if mode == "hashing":
+        combined, text_model, scaler = _hashed_features(df, n_features, batch_size)
+    else:
+        text_model = TfidfVectorizer(max_features=4000, ngram_range=(1, 2), dtype=np.float32)
+        tfidf_matrix = text_model.fit_transform(_text_column(df))
+        scaler = StandardScaler()
+        audio_matrix = scaler.fit_transform(df[AUDIO_COLS].to_numpy(dtype=np.float32))
+        combined = hstack([tfidf_matrix, csr_matrix(audio_matrix)], format="csr", dtype=np.float32)
+    combined = normalize(combined, copy=False)
+    if store_dir and fingerprint:
+        save_artifacts(store_dir, "text_features", fingerprint, params, {"matrix": combined, "tfidf": text_model, "scaler": scaler})
+    return combined, text_model, scaler
+
+def top_k_similar(feature_matrix, indices, n=10, chunk_size=20000, block_size=256, exclude_self=True):
+    """(top_idx, scores) of the n best dot-product matches for each row in `indices`.
+
+    Queries are scored `block_size` at a time against `chunk_size` catalogue rows,
+    keeping a running top-n with argpartition, so memory stays at one
+    block_size x chunk_size score block whatever the catalogue size.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    n_rows = feature_matrix.shape[0]
+    n = min(n, n_rows - 1 if exclude_self else n_rows)
+    top_idx = np.empty((len(indices), n), dtype=np.int64)
+    top_scores = np.empty((len(indices), n), dtype=np.float32)
+    for q_start in range(0, len(indices), block_size):
+        q_ids = indices[q_start:q_start + block_size]
+        queries = feature_matrix[q_ids]
+        best_idx = np.empty((len(q_ids), 0), dtype=np.int64)
+        best_scores = np.empty((len(q_ids), 0), dtype=np.float32)
+        for c_start in range(0, n_rows, chunk_size):
+            c_end = min(c_start + chunk_size, n_rows)
+            scores = queries @ feature_matrix[c_start:c_end].T
+            scores = np.asarray(scores.toarray() if issparse(scores) else scores, dtype=np.float32)
+            if exclude_self:
+                own = (q_ids >= c_start) & (q_ids < c_end)
+                scores[np.flatnonzero(own), q_ids[own] - c_start] = -np.inf
+            cand_scores = np.hstack([best_scores, scores])
+            cand_idx = np.hstack([best_idx, np.broadcast_to(np.arange(c_start, c_end), scores.shape)])
+            if cand_scores.shape[1] > n:
+                keep = np.argpartition(-cand_scores, n - 1, axis=1)[:, :n]
+                cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+            best_idx, best_scores = cand_idx, cand_scores
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        top_idx[q_start:q_start + len(q_ids)] = np.take_along_axis(best_idx, order, axis=1)
+        top_scores[q_start:q_start + len(q_ids)] = np.take_along_axis(best_scores, order, axis=1)
+    return top_idx, top_scores
 
 def recommend_songs(idx, df, feature_matrix, n=10):
-    song_vec = feature_matrix[idx]
-    sim_scores = cosine_similarity(song_vec, feature_matrix).flatten()
-    sim_scores[idx] = -1
-    top_idx = np.argsort(sim_scores)[::-1][:n]
-    recs = df.iloc[top_idx].copy()
-    recs['similarity'] = sim_scores[top_idx]
+    top_idx, scores = top_k_similar(feature_matrix, [idx], n=n)
+    recs = df.iloc[top_idx[0]].copy()
+    recs['similarity'] = scores[0]
+    return recs
+
+def recommend_many(indices, df, feature_matrix, n=10, chunk_size=20000):
+    """recommend_songs for many seeds at once; each row carries its seed's row index in `source_index`."""
+    top_idx, scores = top_k_similar(feature_matrix, indices, n=n, chunk_size=chunk_size)
+    recs = df.iloc[top_idx.ravel()].copy()
+    recs['source_index'] = np.repeat(np.asarray(indices), top_idx.shape[1])
+    recs['similarity'] = scores.ravel()
     return recs
@@ -0,0 +1,388 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+import numpy as np
+import plotly
+import streamlit as st
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import StandardScaler, normalize
+from utils.data_loader import load_prepared, load_track_sources, memory_report, csv_cache_key, dataset_fingerprint, cache_dir_for, cached_fingerprints, ArtistIncidence, build_artist_incidence
+from utils.artifact_store import artifact_dir, load_artifacts, save_artifacts
+from utils.ann import BruteIndex, IVFIndex
+from utils.track_index import NameIndex
+from utils.neighbor_table import load_neighbor_table
+from utils.facets import build_facets
+from utils.typeahead import TrigramIndex
+from utils.aggregates import Aggregates
+from utils.apriori_artist import build_artist_rules, rules_to_matrix
+from utils.hybrid import HybridRanker
+from utils.artist_graph import ArtistGraph
+from utils.vector_store import build_store, load_store
+from utils.playlist_cluster import ClusterEngine, ClusterIndex, sweep_clusters
+
+# Process-wide home of the prepared dataset and everything fitted on it.
+# st.cache_resource hands every session the same object (no pickling, no copies),
+# so callers must treat the returned frame and arrays as read-only.
+#
+# Artifacts are keyed on the dataset fingerprint plus their parameters; the data
+# itself is passed as an underscore argument, which Streamlit does not hash.
+# Fitted artifacts are also persisted to ARTIFACT_DIR so a restart loads them
+# (memory-mapped) instead of refitting. A fresh fit is saved and then served
+# from that mapping too, so the large arrays every page reads (scaled features,
+# cluster labels, neighbour tables) live once in the page cache and every
+# server process on the host maps the same pages read-only.
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset.csv")
+ARTIFACT_DIR = os.path.join(cache_dir_for(DATA_PATH), "artifacts")
+# Above this many rows the "auto" kNN backend switches from exact scans to IVF.
+BRUTE_MAX_ROWS = 200000
+# MUSIC_RECO_COMPACT=1 loads the categorical / float32 layout (see data_loader.compact_frame).
+COMPACT = os.environ.get("MUSIC_RECO_COMPACT", "") == "1"
+# MUSIC_RECO_STREAMING=1 builds the prepared cache chunk by chunk (see data_loader.ingest_streaming).
+STREAMING = os.environ.get("MUSIC_RECO_STREAMING", "") == "1"
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_dataset(path, csv_key, compact, streaming):
+    return load_prepared(path, compact=compact, streaming=streaming)
+
+
+def get_dataset(path=DATA_PATH):
+    """The prepared DataFrame shared by all pages; reloaded when the CSV changes."""
+    return _load_dataset(path, csv_cache_key(path), COMPACT, STREAMING)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _track_sources(path, csv_key, compact):
+    return load_track_sources(path, compact=compact)
+
+
+def get_track_sources(path=DATA_PATH):
+    """Canonical track -> deduplicated CSV rows for the dataset get_dataset serves."""
+    get_dataset(path)
+    return _track_sources(path, csv_cache_key(path), COMPACT)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _memory_report(path, csv_key, streaming):
+    return memory_report(load_prepared(path, streaming=streaming), load_prepared(path, compact=True))
+
+
+def get_memory_report(path=DATA_PATH):
+    """memory_report of the default against the compact layout; builds whichever prepared cache is missing."""
+    return _memory_report(path, csv_cache_key(path), STREAMING)
+
+
+# Row numbers and identifiers are numeric but carry no audio information.
+ID_LIKE = re.compile(r"^unnamed(:|$)|(^|_)id$", re.IGNORECASE)
+
+
+def numeric_columns(df):
+    """Numeric feature columns, leaving out ID-like ones such as `Unnamed: 0` or `*_id`."""
+    return [c for c in df.select_dtypes(include=[np.number]).columns if not ID_LIKE.search(str(c).strip())]
+
+
+def _save(name, fingerprint, params, artifacts, replaces=None):
+    """save_artifacts into ARTIFACT_DIR, keeping the entries of every prepared cache still on disk."""
+    return save_artifacts(ARTIFACT_DIR, name, fingerprint, params, artifacts, cached_fingerprints(DATA_PATH), replaces)
+
+
+def _saved(name, fingerprint, params, arrays):
+    """Saves arrays as the artifact entry `name` and returns the entry mapped back from disk.
+
+    Another worker may have saved its own fit first; whichever entry won is served. Falls
+    back to `arrays` itself when the store cannot be written.
+    """
+    _save(name, fingerprint, params, arrays)
+    stored = load_artifacts(ARTIFACT_DIR, name, fingerprint, params)
+    return arrays if stored is None else stored
+
+
+@st.cache_resource(show_spinner=False)
+def _scaled_features(fingerprint, numeric_cols, _df):
+    params = {"numeric_cols": list(numeric_cols), "dtype": "float32"}
+    stored = load_artifacts(ARTIFACT_DIR, "scaled_features", fingerprint, params)
+    if stored is None:
+        scaler_local = StandardScaler()
+        features32 = _df[list(numeric_cols)].to_numpy(dtype="float32")
+        scaled_local = scaler_local.fit_transform(features32)
+        scaled_local.flags.writeable = False
+        stored = _saved("scaled_features", fingerprint, params, {"scaler": scaler_local, "scaled": scaled_local})
+    return stored["scaler"], stored["scaled"]
+
+
+def get_scaled_features(df, numeric_cols):
+    return _scaled_features(dataset_fingerprint(df), tuple(numeric_cols), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _normalized_features(fingerprint, numeric_cols, _df):
+    params = {"numeric_cols": list(numeric_cols), "dtype": "float32", "norm": "l2"}
+    stored = load_artifacts(ARTIFACT_DIR, "normalized_features", fingerprint, params)
+    if stored is None:
+        _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+        vectors = normalize(np.asarray(scaled, dtype=np.float32))
+        vectors.flags.writeable = False
+        stored = _saved("normalized_features", fingerprint, params, {"vectors": vectors})
+    return stored["vectors"]
+
+
+@st.cache_resource(show_spinner=False)
+def _cluster_engine(fingerprint, numeric_cols, method, _df):
+    _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+    return ClusterEngine(scaled, method=method)
+
+
+def _init_key(init):
+    """Artifact key of a k-means initialisation: "k-means++" or a digest of the warm-start centres."""
+    if init is None:
+        return "k-means++"
+    return hashlib.sha1(np.ascontiguousarray(init, dtype=np.float64).tobytes()).hexdigest()[:16]
+
+
+@st.cache_resource(show_spinner=False)
+def _kmeans(fingerprint, numeric_cols, n_clusters, method, _df):
+    base = {"numeric_cols": list(numeric_cols), "n_clusters": n_clusters, "method": method, "random_state": 42}
+    engine = _cluster_engine(fingerprint, numeric_cols, method, _df)
+    # A warm start depends on which ks this process fitted before, so its result is stored
+    # under its initial centres; a cold k-means++ fit (e.g. from the sweep) is preferred.
+    stored = load_artifacts(ARTIFACT_DIR, "kmeans", fingerprint, {**base, "init": _init_key(None)})
+    if stored is None:
+        init = engine.warm_init(n_clusters)
+        params = {**base, "init": _init_key(init)}
+        if init is not None:
+            stored = load_artifacts(ARTIFACT_DIR, "kmeans", fingerprint, params)
+        if stored is None:
+            model, labels = engine.fit(n_clusters, init)
+            labels.flags.writeable = False
+            stored = _saved("kmeans", fingerprint, params, {"model": model, "labels": labels})
+    engine.remember(n_clusters, stored["model"], stored["labels"])
+    return stored["model"], stored["labels"]
+
+
+def fit_kmeans(df, numeric_cols, n_clusters, method="auto"):
+    """(model, labels) for k clusters of the scaled features; each k is fitted once, mini-batch fits warm-started from the closest k."""
+    return _kmeans(dataset_fingerprint(df), tuple(numeric_cols), n_clusters, method, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _cluster_index(fingerprint, numeric_cols, n_clusters, method, _df):
+    model, labels = _kmeans(fingerprint, numeric_cols, n_clusters, method, _df)
+    _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+    return ClusterIndex(labels, scaled, model.cluster_centers_)
+
+
+def get_cluster_index(df, numeric_cols, n_clusters, method="auto"):
+    """ClusterIndex of the fit_kmeans model for this k, built once and shared read-only."""
+    return _cluster_index(dataset_fingerprint(df), tuple(numeric_cols), n_clusters, method, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _kmeans_sweep(fingerprint, numeric_cols, ks, method, _df):
+    params = {"numeric_cols": list(numeric_cols), "ks": list(ks), "method": method, "random_state": 42}
+    stored = load_artifacts(ARTIFACT_DIR, "kmeans_sweep", fingerprint, params)
+    if stored is not None:
+        return stored["metrics"]
+    _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+    fitted, metrics = sweep_clusters(scaled, ks, method=method)
+    # Each fit is stored under the same key fit_kmeans uses, so picking any swept k afterwards is a load.
+    for k, (model, labels) in fitted.items():
+        kmeans_params = {"numeric_cols": list(numeric_cols), "n_clusters": k, "method": method, "random_state": 42,
+                         "init": _init_key(None)}
+        _save("kmeans", fingerprint, kmeans_params, {"model": model, "labels": labels})
+    _save("kmeans_sweep", fingerprint, params, {"metrics": metrics})
+    return metrics
+
+
+def sweep_kmeans(df, numeric_cols, ks, method="auto"):
+    """Per-k inertia / silhouette / Davies-Bouldin table; fits all ks in parallel and persists every model."""
+    return _kmeans_sweep(dataset_fingerprint(df), tuple(numeric_cols), tuple(ks), method, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _vector_store(fingerprint, numeric_cols, mode, _df):
+    _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+    params = {"numeric_cols": list(numeric_cols), "mode": mode}
+    stored = load_artifacts(ARTIFACT_DIR, "vector_store", fingerprint, params)
+    if stored is not None:
+        return load_store(mode, stored).attach_exact(scaled)
+    stored = _saved("vector_store", fingerprint, params, build_store(scaled, mode).to_arrays())
+    return load_store(mode, stored).attach_exact(scaled)
+
+
+@st.cache_resource(show_spinner=False)
+def _knn_index(fingerprint, numeric_cols, backend, _df):
+    _, scaled = _scaled_features(fingerprint, numeric_cols, _df)
+    if backend == "auto":
+        backend = "ivf" if len(scaled) > BRUTE_MAX_ROWS else "brute"
+    if backend == "brute":
+        return BruteIndex(scaled)
+    if backend in ("float16", "pq"):
+        return _vector_store(fingerprint, numeric_cols, backend, _df)
+    params = {"numeric_cols": list(numeric_cols), "n_lists": "auto"}
+    stored = load_artifacts(ARTIFACT_DIR, "ivf_index", fingerprint, params)
+    if stored is not None:
+        return IVFIndex.from_arrays(stored)
+    return IVFIndex.from_arrays(_saved("ivf_index", fingerprint, params, IVFIndex(scaled).to_arrays()))
+
+
+def get_knn_index(df, numeric_cols, backend="auto"):
+    """Cosine kNN index over the scaled features: "brute" (exact), "ivf" (approximate), "float16" / "pq" (compressed) or "auto"."""
+    return _knn_index(dataset_fingerprint(df), tuple(numeric_cols), backend, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _name_index(fingerprint, _df):
+    return NameIndex(_df["track_name"])
+
+
+def get_name_index(df):
+    """Lower-cased track name -> row ids, built once per dataset."""
+    return _name_index(dataset_fingerprint(df), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _aggregates(fingerprint, _df):
+    stored = load_artifacts(ARTIFACT_DIR, "aggregates", fingerprint, {})
+    if stored is not None:
+        return stored["aggregates"]
+    aggregates = Aggregates.from_frame(_df, incidence=_artist_incidence(fingerprint, _df))
+    _save("aggregates", fingerprint, {}, {"aggregates": aggregates})
+    return aggregates
+
+
+def get_aggregates(df):
+    """Per-artist / album / genre totals, top songs and name -> popularity maps, computed once per dataset."""
+    return _aggregates(dataset_fingerprint(df), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _artist_rule_matrix(fingerprint, min_support, engine, _df):
+    params = {"min_support": min_support, "engine": engine, "metric": "lift", "min_threshold": 1.0}
+    stored = load_artifacts(ARTIFACT_DIR, "artist_rules", fingerprint, params)
+    if stored is not None:
+        return stored["matrix"]
+    incidence = _artist_incidence(fingerprint, _df)
+    try:
+        rules = build_artist_rules(_df, min_support=min_support, engine=engine, incidence=incidence)
+        matrix = rules_to_matrix(rules, incidence.vocab)
+    except ValueError:
+        # No itemsets reached min_support, so there are no rules to apply.
+        matrix = csr_matrix((len(incidence.vocab), len(incidence.vocab)), dtype=np.float32)
+    _save("artist_rules", fingerprint, params, {"matrix": matrix})
+    return matrix
+
+
+def get_artist_rule_matrix(df, min_support=0.002, engine="fpgrowth"):
+    """Artist -> consequent artist lift matrix from the association rules, mined once per dataset."""
+    return _artist_rule_matrix(dataset_fingerprint(df), min_support, engine, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _artist_graph(fingerprint, _df):
+    params = {"top_n": 20, "min_count": 2}
+    stored = load_artifacts(ARTIFACT_DIR, "artist_graph", fingerprint, params)
+    if stored is not None:
+        return ArtistGraph.from_arrays(stored)
+    graph = ArtistGraph.from_incidence(_artist_incidence(fingerprint, _df), **params)
+    _save("artist_graph", fingerprint, params, graph.to_arrays())
+    return graph
+
+
+def get_artist_graph(df):
+    """Artist co-occurrence graph (pair support / confidence / lift, top neighbours) for the shared dataset."""
+    return _artist_graph(dataset_fingerprint(df), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _hybrid_ranker(fingerprint, numeric_cols, rules, _df):
+    vectors = _normalized_features(fingerprint, numeric_cols, _df)
+    if rules == "graph":
+        rule_matrix = _artist_graph(fingerprint, _df).to_rule_matrix("lift")
+    else:
+        rule_matrix = _artist_rule_matrix(fingerprint, 0.002, "fpgrowth", _df)
+    return HybridRanker(vectors, _artist_incidence(fingerprint, _df), rule_matrix, _df["popularity"].to_numpy(), normalized=True)
+
+
+def get_hybrid_ranker(df, numeric_cols, rules="graph"):
+    """HybridRanker over the shared unit-normalized features, artist rules and popularity; rules from the "graph" or "apriori"."""
+    return _hybrid_ranker(dataset_fingerprint(df), tuple(numeric_cols), rules, df)
+
+
+@st.cache_resource(show_spinner=False)
+def _figure(fingerprint, name, params_json, builder, _build):
+    slot = {"name": name, **json.loads(params_json)}
+    params = {"builder": builder, **slot}
+    stored = load_artifacts(ARTIFACT_DIR, "figures", fingerprint, params)
+    if stored is not None:
+        return stored["figure"]
+    figure = json.loads(_build().to_json())
+    # Spec from an earlier revision of the builder (same name and params) is dropped.
+    _save("figures", fingerprint, params, {"figure": figure}, replaces=slot)
+    return figure
+
+
+def _builder_digest(build):
+    """Hash of the file defining build (and the Plotly version), so an edited chart is rebuilt rather than served stale."""
+    try:
+        with open(inspect.getsourcefile(build), "rb") as f:
+            source = f.read()
+    except (OSError, TypeError):
+        code = build.__code__
+        source = code.co_code + repr(code.co_consts).encode()
+    return hashlib.sha1(plotly.__version__.encode() + b"|" + source).hexdigest()[:16]
+
+
+def get_figure(df, name, params, build):
+    """Plotly figure spec (a dict for st.plotly_chart) from build(), serialized once per dataset, name, params and builder code."""
+    return _figure(dataset_fingerprint(df), name, json.dumps(params, sort_keys=True, default=str), _builder_digest(build), build)
+
+
+def neighbor_table_dir(df, numeric_cols, k=50):
+    params = {"numeric_cols": list(numeric_cols), "k": k}
+    return artifact_dir(ARTIFACT_DIR, "neighbor_table", dataset_fingerprint(df), params)
+
+
+@st.cache_resource(show_spinner=False)
+def _neighbor_table(folder, fingerprint):
+    return load_neighbor_table(folder)
+
+
+def get_neighbor_table(df, numeric_cols, k=50):
+    """The precomputed top-k table for this dataset, or None until `python -m utils.neighbor_table` has run."""
+    folder = neighbor_table_dir(df, numeric_cols, k)
+    if not os.path.isdir(folder):
+        return None
+    return _neighbor_table(folder, dataset_fingerprint(df))
+
+
+@st.cache_resource(show_spinner=False)
+def _facets(fingerprint, _df):
+    return build_facets(_df, _artist_incidence(fingerprint, _df))
+
+
+def get_facets(df):
+    """Inverted Artist / Album / Genre indexes for the Preferences filters."""
+    return _facets(dataset_fingerprint(df), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _typeahead(fingerprint, _df):
+    return TrigramIndex(_df["track_name"], _df["artists"], _df["popularity"] if "popularity" in _df.columns else None)
+
+
+def get_typeahead(df):
+    """Trigram quick-search index over track names and artists."""
+    return _typeahead(dataset_fingerprint(df), df)
+
+
+@st.cache_resource(show_spinner=False)
+def _artist_incidence(fingerprint, _df):
+    stored = load_artifacts(ARTIFACT_DIR, "artist_incidence", fingerprint, {})
+    if stored is not None:
+        return ArtistIncidence(stored["vocab"], stored["matrix"])
+    incidence = build_artist_incidence(_df)
+    _save("artist_incidence", fingerprint, {}, {"vocab": incidence.vocab, "matrix": incidence.matrix})
+    return incidence
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+
+def normalize_name(name):
+    return str(name).strip().lower()
+
+
+class NameIndex:
+    """Normalized track name -> sorted row ids, stored as one CSR-style pair of arrays."""
+
+    def __init__(self, names):
+        codes, uniques = pd.factorize(pd.Series(names).astype(str).str.strip().str.lower(), sort=False)
+        self.keys = pd.Index(uniques)
+        self.rows_by_key = np.argsort(codes, kind="stable").astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+
+    def rows(self, name):
+        pos = self.keys.get_indexer([normalize_name(name)])[0]
+        if pos < 0:
+            return np.empty(0, dtype=np.int32)
+        return self.rows_by_key[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def first_row(self, name):
+        rows = self.rows(name)
+        return int(rows[0]) if len(rows) else None
+
+    def rows_many(self, names):
+        """Sorted union of the rows of every name."""
+        positions = self.keys.get_indexer([normalize_name(n) for n in names])
+        parts = [self.rows_by_key[self.offsets[p]:self.offsets[p + 1]] for p in positions if p >= 0]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
@@ -0,0 +1,158 @@
+import unicodedata
+import numpy as np
+
+# Trigram index over "track name | artists" for the Preferences quick search.
+#
+# Every character trigram is packed into one int64 (three 21-bit code points), so
+# the vocabulary is a sorted int64 array and all grams sharing a one- or
+# two-character prefix form a contiguous range of it. Each gram points at the
+# sorted row ids containing it. A query scores rows by how many of its distinct
+# grams they contain: a full match behaves like a substring search, partial
+# matches give typo tolerance. One edit touches at most three grams, so a row
+# may miss 3 * max_edits of them (or 1 - min_overlap, whichever is looser); by
+# default max_edits grows with the query, as short queries have few grams to
+# spare. Rows containing the whole query as a substring are checked against the
+# stored UTF-8 text and ranked first, then rows with a run of words within
+# max_edits edits of the query, then the rest by matching grams.
+
+_SHIFT = 21
+_SPAN = 1 << _SHIFT
+
+
+def _within_edits(a, b, k):
+    """Levenshtein distance of a and b is at most k (banded DP, stops early)."""
+    if abs(len(a) - len(b)) > k:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+        if min(current) > k:
+            return False
+        previous = current
+    return previous[-1] <= k
+
+
+def default_max_edits(query):
+    """Typos tolerated in a normalized query: none up to 2 characters, one up to 5, then two."""
+    return 0 if len(query) <= 2 else 1 if len(query) <= 5 else 2
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def _pack(codes):
+    return (codes[:-2] << (2 * _SHIFT)) | (codes[1:-1] << _SHIFT) | codes[2:]
+
+
+def _doc_grams(texts, first_doc):
+    """Unique (gram, doc) pairs for a batch of padded documents."""
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    docs = np.repeat(np.arange(first_doc, first_doc + len(texts), dtype=np.int32), lengths)
+    grams = _pack(codes)
+    same_doc = docs[:-2] == docs[2:]
+    pairs = np.unique(np.stack([grams[same_doc], docs[:-2][same_doc].astype(np.int64)]), axis=1)
+    return pairs[0], pairs[1].astype(np.int32)
+
+
+class TrigramIndex:
+    def __init__(self, names, artists, popularity=None, batch_size=100000):
+        names, artists = list(names), list(artists)
+        gram_parts, doc_parts, text_parts = [], [], []
+        for start in range(0, len(names), batch_size):
+            texts = [f" {normalize_text(n)} | {normalize_text(a)} "
+                     for n, a in zip(names[start:start + batch_size], artists[start:start + batch_size])]
+            grams, docs = _doc_grams(texts, start)
+            gram_parts.append(grams)
+            doc_parts.append(docs)
+            text_parts.extend(t.encode("utf-8") for t in texts)
+        self.text = b"".join(text_parts)
+        self.text_offsets = np.concatenate([[0], np.cumsum([len(t) for t in text_parts], dtype=np.int64)])
+        grams = np.concatenate(gram_parts) if gram_parts else np.empty(0, dtype=np.int64)
+        docs = np.concatenate(doc_parts) if doc_parts else np.empty(0, dtype=np.int32)
+        order = np.lexsort((docs, grams))
+        grams, self.postings = grams[order], docs[order]
+        self.keys, starts = np.unique(grams, return_index=True)
+        self.offsets = np.append(starts, len(grams))
+        self.n_docs = len(names)
+        if popularity is None:
+            popularity = np.zeros(self.n_docs)
+        popularity = np.asarray(popularity, dtype=np.float64)
+        span = np.ptp(popularity) if len(popularity) else 0.0
+        # Tie-breaker in [0, 1): never outweighs a single extra matching gram.
+        self.prior = ((popularity - popularity.min()) / (span + 1e-9) * 0.999) if span > 0 else np.zeros(self.n_docs)
+
+    def _range(self, low, high):
+        lo, hi = np.searchsorted(self.keys, [low, high])
+        return self.postings[self.offsets[lo]:self.offsets[hi]]
+
+    def _query_slots(self, query):
+        """One posting array per query gram (or gram prefix for queries under three characters)."""
+        codes = np.frombuffer(query.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        if len(codes) == 1:
+            # Single character: words starting with it.
+            head = (ord(" ") << (2 * _SHIFT)) | (codes[0] << _SHIFT)
+            return [np.unique(self._range(head, head + _SPAN))]
+        if len(codes) == 2:
+            head = (codes[0] << (2 * _SHIFT)) | (codes[1] << _SHIFT)
+            return [np.unique(self._range(head, head + _SPAN))]
+        slots = []
+        for gram in np.unique(_pack(codes)):
+            pos = np.searchsorted(self.keys, gram)
+            if pos < len(self.keys) and self.keys[pos] == gram:
+                slots.append(self.postings[self.offsets[pos]:self.offsets[pos + 1]])
+            else:
+                slots.append(np.empty(0, dtype=np.int32))
+        return slots
+
+    def _contains(self, row, needle):
+        return needle in self.text[self.text_offsets[row]:self.text_offsets[row + 1]]
+
+    def _near(self, row, query, max_edits):
+        """Some run of len(query.split()) consecutive words of the row is within max_edits of query."""
+        words = self.text[self.text_offsets[row]:self.text_offsets[row + 1]].decode("utf-8").split()
+        n = len(query.split())
+        return any(_within_edits(" ".join(words[i:i + n]), query, max_edits) for i in range(len(words) - n + 1))
+
+    def search(self, query, limit=50, min_overlap=0.6, max_edits=None, verify_max=5000, fuzzy_max=500):
+        """Row ids ranked by exact substring match, then matching grams, then popularity."""
+        query = normalize_text(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        slots = self._query_slots(query)
+        hits = [s for s in slots if len(s)]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        rows, counts = np.unique(np.concatenate(hits), return_counts=True)
+        if max_edits is None:
+            max_edits = default_max_edits(query)
+        needed = max(1, min(int(np.ceil(min_overlap * len(slots))), len(slots) - 3 * max_edits))
+        keep = counts >= needed
+        rows, counts = rows[keep], counts[keep]
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64)
+        score = counts + self.prior[rows]
+        # Only rows holding every gram can contain the query; verify the most popular of them.
+        full = np.flatnonzero(counts == len(slots))
+        if len(full) > verify_max:
+            full = full[np.argpartition(-score[full], verify_max - 1)[:verify_max]]
+        needle = query.encode("utf-8")
+        exact = [i for i in full if self._contains(rows[i], needle)]
+        score[exact] += len(slots) + 1
+        if max_edits and len(exact) < limit:
+            # Typos: edit-distance check on the best remaining candidates by matching grams.
+            rest = np.setdiff1d(np.arange(len(rows)), exact)
+            if len(rest) > fuzzy_max:
+                rest = rest[np.argpartition(-score[rest], fuzzy_max - 1)[:fuzzy_max]]
+            near = [i for i in rest if self._near(rows[i], query, max_edits)]
+            score[near] += len(slots)
+        k = min(limit, len(rows))
+        top = np.argpartition(-score, k - 1)[:k]
+        return rows[top[np.argsort(-score[top], kind="stable")]].astype(np.int64)
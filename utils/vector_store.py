@@ -0,0 +1,168 @@
+import numpy as np
+from sklearn.cluster import KMeans
+from utils.ann import BruteIndex, _normalize, _top_k
+
+# Compressed copies of the normalized feature matrix for cosine search, with the
+# BruteIndex.kneighbors call shape so the recommendation page can swap them in.
+#
+# "float16" halves the float32 matrix. "pq" (product quantization) splits every
+# vector into n_subspaces slices and stores, per slice, the id of the nearest of
+# 256 trained centroids: one byte per slice instead of four per dimension. A
+# query is scored against the codes through one small lookup table per slice
+# (asymmetric distance: the query itself is never quantized).
+#
+# Either way the best n_neighbors * rerank candidates are re-scored against the
+# exact float32 vectors when a source is attached. In the app both the codes
+# and that source (the scaled features) are read-only mappings of artifact-store
+# files, paged in on demand and shared by every process rather than held by
+# each one.
+
+STORE_MODES = ("float16", "pq")
+
+
+class _CompressedStore:
+    rerank = 4
+    exact = None
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def attach_exact(self, vectors):
+        """Uses `vectors` (float32, same rows) to re-rank candidates; returns self."""
+        self.exact = vectors
+        return self
+
+    def kneighbors(self, X, n_neighbors=5, rerank=None):
+        Q = _normalize(X)
+        rerank = self.rerank if rerank is None else rerank
+        exact = self.exact is not None and rerank > 1
+        pool = min(len(self), n_neighbors * rerank) if exact else n_neighbors
+        scores = self.approximate_scores(Q)
+        distances = np.empty((len(Q), n_neighbors), dtype=np.float32)
+        indices = np.empty((len(Q), n_neighbors), dtype=np.int64)
+        for i, row_scores in enumerate(scores):
+            top = _top_k(row_scores, pool)
+            sims = row_scores[top]
+            if exact:
+                # Sorted ids turn the gather from the mapped matrix into a forward scan.
+                top = np.sort(top)
+                sims = _normalize(np.asarray(self.exact[top])) @ Q[i]
+                best = _top_k(sims, n_neighbors)
+                top, sims = top[best], sims[best]
+            indices[i] = top[:n_neighbors]
+            distances[i] = 1.0 - sims[:n_neighbors]
+        return distances, indices
+
+
+class Float16Store(_CompressedStore):
+    def __init__(self, vectors, chunk_size=65536):
+        self.codes = _normalize(vectors).astype(np.float16)
+        self.chunk_size = chunk_size
+
+    def approximate_scores(self, Q):
+        scores = np.empty((len(Q), len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.chunk_size):
+            block = self.codes[start:start + self.chunk_size].astype(np.float32)
+            scores[:, start:start + len(block)] = Q @ block.T
+        return scores
+
+    def to_arrays(self):
+        return {"codes": self.codes}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        store = cls.__new__(cls)
+        store.codes = arrays["codes"]
+        store.chunk_size = 65536
+        return store
+
+
+class PQStore(_CompressedStore):
+    # Codes are coarse, so re-score a wider pool; 50 x k exact dot products are still negligible.
+    rerank = 50
+
+    def __init__(self, vectors, n_subspaces=None, n_centroids=256, sample_size=50000, seed=0):
+        V = _normalize(vectors)
+        n_rows, dim = V.shape
+        n_subspaces = n_subspaces or max(1, int(np.ceil(dim / 2)))
+        self.dim = dim
+        self.sub_dim = int(np.ceil(dim / n_subspaces))
+        V = self._pad(V)
+        n_centroids = min(n_centroids, 256, n_rows)
+        rng = np.random.default_rng(seed)
+        sample = V[rng.choice(n_rows, min(n_rows, sample_size), replace=False)]
+        self.codebooks = np.empty((n_subspaces, n_centroids, self.sub_dim), dtype=np.float32)
+        self.codes = np.empty((n_rows, n_subspaces), dtype=np.uint8)
+        for j in range(n_subspaces):
+            part = slice(j * self.sub_dim, (j + 1) * self.sub_dim)
+            km = KMeans(n_clusters=n_centroids, n_init=1, random_state=seed).fit(sample[:, part])
+            self.codebooks[j] = km.cluster_centers_
+            self.codes[:, j] = km.predict(V[:, part])
+
+    def _pad(self, X):
+        width = self.sub_dim * ((self.dim + self.sub_dim - 1) // self.sub_dim)
+        if X.shape[1] == width:
+            return X
+        return np.hstack([X, np.zeros((len(X), width - X.shape[1]), dtype=np.float32)])
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    def approximate_scores(self, Q):
+        Q = self._pad(np.asarray(Q, dtype=np.float32)).reshape(len(Q), -1, self.sub_dim)
+        # tables[q, j, c] = <query slice j, centroid c of subspace j>
+        tables = np.einsum("qjs,jcs->qjc", Q, self.codebooks)
+        scores = np.zeros((len(Q), len(self)), dtype=np.float32)
+        for j in range(self.codes.shape[1]):
+            scores += tables[:, j, :][:, self.codes[:, j]]
+        return scores
+
+    def to_arrays(self):
+        return {"codes": self.codes, "codebooks": self.codebooks, "shape": np.array([self.dim, self.sub_dim])}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        store = cls.__new__(cls)
+        store.codes = arrays["codes"]
+        store.codebooks = np.asarray(arrays["codebooks"])
+        store.dim, store.sub_dim = (int(v) for v in arrays["shape"])
+        return store
+
+
+def build_store(vectors, mode="float16", **kwargs):
+    if mode not in STORE_MODES:
+        raise ValueError(f"unknown vector store mode {mode!r}; expected one of {STORE_MODES}")
+    return Float16Store(vectors, **kwargs) if mode == "float16" else PQStore(vectors, **kwargs)
+
+
+def load_store(mode, arrays):
+    return (Float16Store if mode == "float16" else PQStore).from_arrays(arrays)
+
+
+def accuracy_report(store, vectors, k=10, n_queries=200, seed=0):
+    """Recall@k against exact search with and without re-ranking, score error and memory saved."""
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)])
+    Q = _normalize(queries)
+    _, truth = BruteIndex(vectors).kneighbors(queries, n_neighbors=k)
+    _, raw = store.kneighbors(queries, n_neighbors=k, rerank=1)
+    _, reranked = store.kneighbors(queries, n_neighbors=k)
+    exact_sims = np.einsum("qkd,qd->qk", _normalize(np.asarray(vectors)[truth.ravel()]).reshape(len(Q), k, -1), Q)
+    approx_sims = np.take_along_axis(store.approximate_scores(Q), truth, axis=1)
+    exact_bytes = len(vectors) * np.asarray(vectors[:1]).shape[1] * 4
+
+    def recall(found):
+        return sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found)) / (k * len(Q))
+    return {
+        "k": k,
+        "recall": recall(raw),
+        "recall_reranked": recall(reranked) if store.exact is not None else None,
+        "mean_abs_score_error": float(np.abs(exact_sims - approx_sims).mean()),
+        "bytes": int(store.nbytes),
+        "compression": exact_bytes / max(store.nbytes, 1),
+    }